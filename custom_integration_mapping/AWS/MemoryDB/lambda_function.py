@@ -1,10 +1,18 @@
+import gzip
+import hashlib
 import json
 import logging
 import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from urllib.request import Request, urlopen
-from urllib.error import HTTPError, URLError
+from urllib.error import HTTPError
 
 import boto3
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
 
 # -----------------------------------------------------------------------------
@@ -17,23 +25,92 @@ OPSLEVEL_WEBHOOK_URL = os.getenv("OPSLEVEL_WEBHOOK_URL")
 OPSLEVEL_EXTERNAL_KIND = os.getenv("OPSLEVEL_EXTERNAL_KIND", "aws_memorydb_cluster")
 CLUSTER_FILTER = os.getenv("CLUSTER_FILTER")  # optional exact cluster name
 
+# OpsLevel delivery: clusters are posted per region in chunks of at most
+# OPSLEVEL_CHUNK_SIZE, each gzip-encoded and retried on its own.
+OPSLEVEL_CHUNK_SIZE = max(1, int(os.getenv("OPSLEVEL_CHUNK_SIZE", "100")))
+OPSLEVEL_GZIP = os.getenv("OPSLEVEL_GZIP", "true").strip().lower() in ("1", "true", "yes")
+OPSLEVEL_POST_TIMEOUT_SECONDS = float(os.getenv("OPSLEVEL_POST_TIMEOUT_SECONDS", "30"))
+OPSLEVEL_POST_MAX_ATTEMPTS = max(1, int(os.getenv("OPSLEVEL_POST_MAX_ATTEMPTS", "3")))
+OPSLEVEL_RETRY_BASE_SECONDS = float(os.getenv("OPSLEVEL_RETRY_BASE_SECONDS", "1"))
+OPSLEVEL_RETRY_MAX_SECONDS = float(os.getenv("OPSLEVEL_RETRY_MAX_SECONDS", "10"))
+
+# Delta delivery: fingerprints of the clusters last delivered to OpsLevel are kept
+# in CLUSTER_STATE_URI (a local JSON file or s3://bucket/key; empty disables it).
+# Only added and changed clusters are posted, plus tombstones for removed ones.
+# Every FULL_RESYNC_SECONDS (0 = every run) all clusters are posted again.
+CLUSTER_STATE_URI = os.getenv("CLUSTER_STATE_URI", "/tmp/memorydb_cluster_state.json").strip()
+FULL_RESYNC_SECONDS = max(0.0, float(os.getenv("FULL_RESYNC_SECONDS", "86400")))
+# Comma-separated top-level cluster fields to fingerprint; empty means the whole enriched cluster
+FINGERPRINT_FIELDS = [f.strip() for f in os.getenv("FINGERPRINT_FIELDS", "").split(",") if f.strip()]
+
 # REGION_MODE:
 # - "all"  => query all AWS regions where MemoryDB is available
 # - "list" => query only regions in REGION_LIST
 REGION_MODE = os.getenv("REGION_MODE", "all").strip().lower()
 REGION_LIST = os.getenv("REGION_LIST", "").strip()
 
+# Region scan concurrency and limits. A region that does not finish within
+# REGION_TIMEOUT_SECONDS is reported in region_errors and no longer waited for.
+# The whole scan stops after SCAN_TIMEOUT_SECONDS; regions still queued or running
+# then (e.g. behind workers stuck on hung regions) are reported the same way.
+REGION_CONCURRENCY = max(1, int(os.getenv("REGION_CONCURRENCY", "8")))
+REGION_TIMEOUT_SECONDS = max(1.0, float(os.getenv("REGION_TIMEOUT_SECONDS", "60")))
+SCAN_TIMEOUT_SECONDS = max(REGION_TIMEOUT_SECONDS, float(os.getenv("SCAN_TIMEOUT_SECONDS", "120")))
+
+# botocore defaults to a 60 s connect timeout, which an unreachable region pays in full
+AWS_CONNECT_TIMEOUT_SECONDS = float(os.getenv("AWS_CONNECT_TIMEOUT_SECONDS", "5"))
+AWS_READ_TIMEOUT_SECONDS = float(os.getenv("AWS_READ_TIMEOUT_SECONDS", "20"))
+AWS_MAX_ATTEMPTS = max(1, int(os.getenv("AWS_MAX_ATTEMPTS", "3")))
+
+# ListTags calls run concurrently per region; throttled calls are retried with
+# jittered exponential backoff on top of botocore's own retries.
+TAG_CONCURRENCY = max(1, int(os.getenv("TAG_CONCURRENCY", "4")))
+TAG_THROTTLE_MAX_RETRIES = max(0, int(os.getenv("TAG_THROTTLE_MAX_RETRIES", "5")))
+TAG_THROTTLE_BASE_SECONDS = float(os.getenv("TAG_THROTTLE_BASE_SECONDS", "0.5"))
+TAG_THROTTLE_MAX_SECONDS = float(os.getenv("TAG_THROTTLE_MAX_SECONDS", "8"))
+THROTTLING_ERROR_CODES = {"ThrottlingException", "Throttling", "TooManyRequestsException"}
+
+# Region activity cache (REGION_MODE=all only): regions that had no clusters when
+# last probed are skipped until REGION_REPROBE_SECONDS have passed. The cache is a
+# local JSON file (e.g. in /tmp) or an S3 object given as s3://bucket/key; set
+# REGION_CACHE_URI to an empty value to scan every region on every invocation.
+REGION_CACHE_URI = os.getenv("REGION_CACHE_URI", "/tmp/memorydb_region_cache.json").strip()
+REGION_REPROBE_SECONDS = max(0.0, float(os.getenv("REGION_REPROBE_SECONDS", "86400")))
+
+BOTO_CONFIG = Config(
+    connect_timeout=AWS_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=AWS_READ_TIMEOUT_SECONDS,
+    retries={"max_attempts": AWS_MAX_ATTEMPTS, "mode": "standard"},
+    # Each region's client is shared by its ListTags workers
+    max_pool_connections=max(10, TAG_CONCURRENCY),
+)
+
+# -----------------------------------------------------------------------------
+# AWS session and client cache
+# -----------------------------------------------------------------------------
+# Created once per Lambda container and reused by warm invocations. Creating
+# clients from a session is not thread-safe, so the region workers go through
+# _MEMORYDB_CLIENTS_LOCK; the clients themselves are safe to share.
+AWS_SESSION = boto3.session.Session()
+_MEMORYDB_CLIENTS = {}
+_MEMORYDB_CLIENTS_LOCK = threading.Lock()
+
 
 def get_memorydb_client(region_name):
-    logger.debug(f"Creating MemoryDB client for region={region_name}")
-    return boto3.client("memorydb", region_name=region_name)
+    with _MEMORYDB_CLIENTS_LOCK:
+        client = _MEMORYDB_CLIENTS.get(region_name)
+        if client is None:
+            logger.debug(f"Creating MemoryDB client for region={region_name}")
+            client = AWS_SESSION.client("memorydb", region_name=region_name, config=BOTO_CONFIG)
+            _MEMORYDB_CLIENTS[region_name] = client
+        else:
+            logger.debug(f"Reusing cached MemoryDB client for region={region_name}")
+    return client
 
 
 def get_enabled_regions():
     logger.info(f"Resolving regions with REGION_MODE={REGION_MODE}")
 
-    session = boto3.session.Session()
-
     if REGION_MODE == "list":
         regions = [r.strip() for r in REGION_LIST.split(",") if r.strip()]
         logger.info(f"Parsed REGION_LIST regions={regions}")
@@ -44,12 +121,107 @@ def get_enabled_regions():
 
         return regions
 
-    regions = session.get_available_regions("memorydb")
+    regions = AWS_SESSION.get_available_regions("memorydb")
     logger.info(f"Discovered {len(regions)} MemoryDB-supported regions")
     logger.debug(f"All discovered regions={regions}")
     return regions
 
 
+def read_state_object(uri):
+    """
+    Load a JSON state document from a local file or an s3://bucket/key URI.
+    Returns None if it does not exist or cannot be read.
+    """
+    try:
+        if uri.startswith("s3://"):
+            bucket, _, key = uri[len("s3://"):].partition("/")
+            s3 = AWS_SESSION.client("s3", config=BOTO_CONFIG)
+            try:
+                body = s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                    return None
+                raise
+            return json.loads(body)
+
+        if not os.path.exists(uri):
+            return None
+        with open(uri, "r") as f:
+            return json.load(f)
+    except (BotoCoreError, ClientError, OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable state object uri={uri} error={e}")
+        return None
+
+
+def write_state_object(uri, data):
+    """
+    Store a JSON state document in a local file (atomically) or an s3://bucket/key URI.
+    Failures are logged and do not fail the invocation.
+    """
+    body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    try:
+        if uri.startswith("s3://"):
+            bucket, _, key = uri[len("s3://"):].partition("/")
+            s3 = AWS_SESSION.client("s3", config=BOTO_CONFIG)
+            s3.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json")
+        else:
+            directory = os.path.dirname(uri)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{uri}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(body)
+            os.replace(temp_path, uri)
+        logger.debug(f"Wrote state object uri={uri} bytes={len(body)}")
+    except (BotoCoreError, ClientError, OSError) as e:
+        logger.warning(f"Failed to write state object uri={uri} error={e}")
+
+
+def select_regions_to_scan(regions, region_cache, now):
+    """
+    Split regions into (to_scan, skipped). A region is skipped only if it had no
+    clusters when it was last probed, less than REGION_REPROBE_SECONDS ago.
+    """
+    to_scan = []
+    skipped = []
+    for region_name in regions:
+        entry = region_cache.get(region_name) or {}
+        try:
+            probed_at = datetime.fromisoformat(entry["probed_at"])
+        except (KeyError, TypeError, ValueError):
+            probed_at = None
+
+        if (
+            probed_at is not None
+            and entry.get("cluster_count") == 0
+            and (now - probed_at).total_seconds() < REGION_REPROBE_SECONDS
+        ):
+            skipped.append(region_name)
+        else:
+            to_scan.append(region_name)
+
+    logger.info(
+        f"Region activity cache: scanning {len(to_scan)} region(s), "
+        f"skipping {len(skipped)} recently empty region(s)"
+    )
+    logger.debug(f"Skipped regions={skipped}")
+    return to_scan, skipped
+
+
+def update_region_cache(region_cache, region_cluster_counts, now):
+    """
+    Record the cluster count of every successfully scanned region. Regions that
+    failed keep their previous entry, so they are probed again next time.
+    """
+    probed_at = now.isoformat()
+    for region_name, cluster_count in region_cluster_counts.items():
+        region_cache[region_name] = {
+            "cluster_count": cluster_count,
+            "probed_at": probed_at,
+        }
+    return region_cache
+
+
 def get_all_clusters(memorydb_client, region_name):
     logger.info(f"Fetching MemoryDB clusters for region={region_name}")
     paginator = memorydb_client.get_paginator("describe_clusters")
@@ -70,6 +242,7 @@ def get_cluster_tags(memorydb_client, cluster_arn):
     """
     Fetch AWS resource tags for a MemoryDB cluster via ListTags.
     Returns a list of dicts [{"Key": "...", "Value": "..."}] (JSON-serializable).
+    Throttled calls are retried up to TAG_THROTTLE_MAX_RETRIES times.
     On failure (e.g. missing permission), returns [] and logs the error.
     """
     if not cluster_arn:
@@ -77,7 +250,24 @@ def get_cluster_tags(memorydb_client, cluster_arn):
         return []
 
     try:
-        response = memorydb_client.list_tags(ResourceArn=cluster_arn)
+        attempt = 0
+        while True:
+            try:
+                response = memorydb_client.list_tags(ResourceArn=cluster_arn)
+                break
+            except ClientError as e:
+                error_code = e.response.get("Error", {}).get("Code")
+                if error_code not in THROTTLING_ERROR_CODES or attempt >= TAG_THROTTLE_MAX_RETRIES:
+                    raise
+                # Full jitter keeps concurrent workers from retrying in lockstep
+                delay = random.uniform(0, min(TAG_THROTTLE_MAX_SECONDS, TAG_THROTTLE_BASE_SECONDS * (2 ** attempt)))
+                attempt += 1
+                logger.info(
+                    f"ListTags throttled for ARN={cluster_arn}; "
+                    f"retry {attempt}/{TAG_THROTTLE_MAX_RETRIES} in {delay:.2f}s"
+                )
+                time.sleep(delay)
+
         tag_list = response.get("TagList", [])
         out = [
             {"Key": str(t.get("Key", "")), "Value": str(t.get("Value", ""))}
@@ -96,6 +286,22 @@ def get_cluster_tags(memorydb_client, cluster_arn):
         return []
 
 
+def get_clusters_tags(memorydb_client, clusters, region_name):
+    """
+    Fetch the tags of all clusters of one region on up to TAG_CONCURRENCY threads.
+    Returns one tag list per cluster, in the order of `clusters`.
+    """
+    cluster_arns = [cluster.get("ARN") for cluster in clusters]
+    if len(cluster_arns) <= 1 or TAG_CONCURRENCY == 1:
+        return [get_cluster_tags(memorydb_client, arn) for arn in cluster_arns]
+
+    workers = min(TAG_CONCURRENCY, len(cluster_arns))
+    logger.debug(f"Fetching tags for {len(cluster_arns)} cluster(s) in region={region_name} with {workers} worker(s)")
+    # boto3 clients are thread-safe, so the region's client is shared by the workers
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"tags-{region_name}") as executor:
+        return list(executor.map(lambda arn: get_cluster_tags(memorydb_client, arn), cluster_arns))
+
+
 def get_account_id(context):
     """
     Resolve AWS account ID from the Lambda function ARN instead of calling STS.
@@ -115,17 +321,38 @@ def get_account_id(context):
         raise
 
 
-def serialize_for_json(value):
+class ClusterJSONEncoder(json.JSONEncoder):
+    """
+    JSON encoder for raw boto3 responses. Datetimes (and other values with
+    isoformat) are written as ISO 8601 strings while encoding, so clusters never
+    need a converted copy; anything else unknown is written as str().
+    """
+
+    def default(self, o):
+        if hasattr(o, "isoformat"):
+            return o.isoformat()
+        return str(o)
+
+
+CLUSTER_ENCODER = ClusterJSONEncoder(separators=(",", ":"))
+
+
+def encode_cluster(cluster):
+    """
+    Encode one enriched cluster to a JSON string. Each cluster is encoded once per
+    invocation; the OpsLevel chunks and the Lambda result are assembled from these.
+    """
+    return CLUSTER_ENCODER.encode(cluster)
+
+
+def encode_result(result, encoded_clusters):
     """
-    Recursively convert boto/datetime-like values into JSON-safe values.
+    Encode the Lambda result, splicing in the already encoded clusters as
+    `payload.clusters` instead of encoding them again.
     """
-    if isinstance(value, dict):
-        return {k: serialize_for_json(v) for k, v in value.items()}
-    if isinstance(value, list):
-        return [serialize_for_json(v) for v in value]
-    if hasattr(value, "isoformat"):
-        return value.isoformat()
-    return value
+    head = CLUSTER_ENCODER.encode(result)
+    clusters_json = ",".join(encoded_clusters)
+    return f'{head[:-1]},"payload":{{"clusters":[{clusters_json}]}}}}'
 
 
 def enrich_cluster(cluster, region_name, account_id, tags):
@@ -136,156 +363,439 @@ def enrich_cluster(cluster, region_name, account_id, tags):
     cluster_name = cluster.get("Name")
     logger.info(f"Enriching raw cluster payload for cluster={cluster_name} region={region_name}")
 
-    enriched = serialize_for_json(cluster.copy())
+    # Shallow copy: nested values are shared with the boto3 response and converted by the encoder
+    enriched = dict(cluster)
     enriched["Tags"] = tags
     enriched["region"] = region_name
     enriched["accountId"] = account_id
 
-    logger.debug(
-        f"Enriched raw cluster={cluster_name} region={region_name} payload="
-        f"{json.dumps(enriched, default=str)}"
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            f"Enriched raw cluster={cluster_name} region={region_name} payload="
+            f"{encode_cluster(enriched)}"
+        )
     return enriched
 
 
+def scan_region(region_name, account_id):
+    """
+    Fetch, filter, tag and enrich the clusters of one region.
+    Returns (enriched clusters, cluster count before CLUSTER_FILTER).
+    Errors are raised to the caller, which records them in region_errors.
+    """
+    logger.info(f"Scanning MemoryDB in region={region_name}")
+    client = get_memorydb_client(region_name)
+    clusters = get_all_clusters(client, region_name)
+    cluster_count = len(clusters)
+
+    if CLUSTER_FILTER:
+        logger.info(
+            f"Applying CLUSTER_FILTER={CLUSTER_FILTER} in region={region_name}"
+        )
+        pre_filter_count = len(clusters)
+        clusters = [c for c in clusters if c.get("Name") == CLUSTER_FILTER]
+        logger.info(
+            f"Region={region_name} clusters before_filter={pre_filter_count} "
+            f"after_filter={len(clusters)}"
+        )
+
+    enriched_clusters = []
+    cluster_tags = get_clusters_tags(client, clusters, region_name)
+    for cluster, tags in zip(clusters, cluster_tags):
+        cluster_name = cluster.get("Name")
+
+        logger.debug(
+            f"Attached {len(tags)} tag(s) to cluster={cluster_name} region={region_name}"
+        )
+
+        enriched_clusters.append(
+            enrich_cluster(cluster, region_name, account_id, tags)
+        )
+
+    logger.info(
+        f"Completed region={region_name} raw_clusters={len(enriched_clusters)}"
+    )
+    return enriched_clusters, cluster_count
+
+
+def region_error(region_name, e):
+    """
+    Log a failed region scan and return its region_errors entry.
+    """
+    error_text = str(e)
+    if isinstance(e, (BotoCoreError, ClientError)):
+        if "Connect timeout on endpoint URL" in error_text:
+            logger.error(
+                f"Network connectivity failure for region={region_name}. "
+                f"Check Lambda VPC/NAT/egress settings. error={error_text}"
+            )
+        logger.error(f"Region scan failed for region={region_name}: {error_text}", exc_info=e)
+    else:
+        logger.error(
+            f"Unexpected error during region scan for region={region_name}: {error_text}",
+            exc_info=e,
+        )
+    return {
+        "region": region_name,
+        "error": error_text
+    }
+
+
 def collect_clusters_across_regions(context, regions):
+    """
+    Scan all regions concurrently.
+    Returns (clusters, region_errors, cluster count per successfully scanned region).
+    """
     logger.info("Starting multi-region MemoryDB collection")
 
     account_id = get_account_id(context)
 
-    all_clusters = []
-    region_errors = []
+    results = {}
+    errors = {}
+    started = {}
 
-    logger.info(f"Beginning scan across {len(regions)} region(s)")
+    workers = max(1, min(REGION_CONCURRENCY, len(regions)))
+    logger.info(f"Beginning scan across {len(regions)} region(s) with {workers} worker(s)")
 
-    for region_name in regions:
-        logger.info(f"Scanning MemoryDB in region={region_name}")
-        client = get_memorydb_client(region_name)
+    def run(region_name):
+        started[region_name] = time.monotonic()
+        return scan_region(region_name, account_id)
 
-        try:
-            clusters = get_all_clusters(client, region_name)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="region")
+    scan_deadline = time.monotonic() + SCAN_TIMEOUT_SECONDS
+    futures = {executor.submit(run, region_name): region_name for region_name in regions}
+    pending = set(futures)
 
-            if CLUSTER_FILTER:
-                logger.info(
-                    f"Applying CLUSTER_FILTER={CLUSTER_FILTER} in region={region_name}"
-                )
-                pre_filter_count = len(clusters)
-                clusters = [c for c in clusters if c.get("Name") == CLUSTER_FILTER]
-                logger.info(
-                    f"Region={region_name} clusters before_filter={pre_filter_count} "
-                    f"after_filter={len(clusters)}"
-                )
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                region_name = futures[future]
+                try:
+                    results[region_name] = future.result()
+                except Exception as e:
+                    errors[region_name] = region_error(region_name, e)
+
+            # A worker stuck on one region cannot be interrupted; stop waiting for it instead
+            now = time.monotonic()
+            for future in list(pending):
+                region_name = futures[future]
+                region_started = started.get(region_name)
+                if region_started is not None and now - region_started > REGION_TIMEOUT_SECONDS:
+                    pending.discard(future)
+                    logger.error(
+                        f"Region scan timed out for region={region_name} "
+                        f"after {REGION_TIMEOUT_SECONDS:g}s"
+                    )
+                    errors[region_name] = {
+                        "region": region_name,
+                        "error": f"Region scan timed out after {REGION_TIMEOUT_SECONDS:g}s"
+                    }
+
+            # Hung workers keep their threads, so queued regions may never start; bound the whole scan
+            if pending and now >= scan_deadline:
+                for future in pending:
+                    region_name = futures[future]
+                    state = "running" if region_name in started else "queued"
+                    logger.error(
+                        f"Region scan still {state} for region={region_name} "
+                        f"at the {SCAN_TIMEOUT_SECONDS:g}s scan deadline"
+                    )
+                    errors[region_name] = {
+                        "region": region_name,
+                        "error": f"Region scan still {state} at the {SCAN_TIMEOUT_SECONDS:g}s scan deadline"
+                    }
+                pending = set()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # Keep the output in region order regardless of completion order
+    all_clusters = [c for region_name in regions for c in results.get(region_name, ([], 0))[0]]
+    region_errors = [errors[region_name] for region_name in regions if region_name in errors]
+    region_cluster_counts = {
+        region_name: results[region_name][1] for region_name in regions if region_name in results
+    }
 
-            enriched_clusters = []
-            for cluster in clusters:
-                cluster_name = cluster.get("Name")
-                cluster_arn = cluster.get("ARN")
-                tags = get_cluster_tags(client, cluster_arn)
+    logger.info(
+        f"Finished multi-region collection total_clusters={len(all_clusters)} "
+        f"region_errors={len(region_errors)}"
+    )
+    return all_clusters, region_errors, region_cluster_counts
 
-                logger.debug(
-                    f"Attached {len(tags)} tag(s) to cluster={cluster_name} region={region_name}"
-                )
 
-                enriched_clusters.append(
-                    enrich_cluster(cluster, region_name, account_id, tags)
-                )
+def build_post_chunks(clusters, encoded_clusters):
+    """
+    Group clusters by region, in the order they were collected, and split each
+    region into chunks of at most OPSLEVEL_CHUNK_SIZE clusters.
+    Returns a list of (region, [(cluster, encoded cluster), ...]) tuples.
+    """
+    by_region = {}
+    for cluster, encoded in zip(clusters, encoded_clusters):
+        by_region.setdefault(cluster.get("region"), []).append((cluster, encoded))
 
-            all_clusters.extend(enriched_clusters)
-            logger.info(
-                f"Completed region={region_name} raw_clusters={len(enriched_clusters)}"
-            )
+    chunks = []
+    for region_name, region_clusters in by_region.items():
+        for start in range(0, len(region_clusters), OPSLEVEL_CHUNK_SIZE):
+            chunks.append((region_name, region_clusters[start:start + OPSLEVEL_CHUNK_SIZE]))
+    return chunks
 
-        except (BotoCoreError, ClientError) as e:
-            error_text = str(e)
-            if "Connect timeout on endpoint URL" in error_text:
-                logger.error(
-                    f"Network connectivity failure for region={region_name}. "
-                    f"Check Lambda VPC/NAT/egress settings. error={error_text}"
-                )
-            logger.exception(f"Region scan failed for region={region_name}: {error_text}")
-            region_errors.append({
-                "region": region_name,
-                "error": error_text
-            })
+
+def post_chunk(url, chunk_number, region_name, clusters):
+    """
+    POST one chunk of encoded clusters to OpsLevel, retrying throttling, server
+    errors and network failures with jittered exponential backoff. Returns the
+    chunk's result.
+    """
+    body = f'{{"clusters":[{",".join(clusters)}]}}'.encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"OpsLevel chunk={chunk_number} payload={body.decode('utf-8')}")
+    if OPSLEVEL_GZIP:
+        json_bytes = len(body)
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+        logger.debug(f"OpsLevel chunk={chunk_number} gzip bytes={json_bytes}->{len(body)}")
+
+    label = f"chunk={chunk_number} region={region_name} cluster_count={len(clusters)}"
+    result = {"region": region_name, "cluster_count": len(clusters), "posted": False}
+
+    for attempt in range(1, OPSLEVEL_POST_MAX_ATTEMPTS + 1):
+        result["attempts"] = attempt
+        req = Request(url, data=body, headers=headers, method="POST")
+
+        try:
+            with urlopen(req, timeout=OPSLEVEL_POST_TIMEOUT_SECONDS) as resp:
+                response_body = resp.read().decode("utf-8", errors="replace")
+                logger.info(f"OpsLevel POST succeeded {label} status_code={resp.status}")
+                logger.debug(f"OpsLevel response body={response_body}")
+                result.update({"posted": True, "status_code": resp.status})
+                result.pop("error", None)
+                return result
+        except HTTPError as e:
+            error_body = e.read().decode("utf-8", errors="replace")
+            result.update({"status_code": e.code, "error": error_body})
+            retryable = e.code == 429 or e.code >= 500
+        except OSError as e:
+            # URLError and socket timeouts
+            result["error"] = str(e)
+            retryable = True
         except Exception as e:
-            logger.exception(
-                f"Unexpected error during region scan for region={region_name}: {str(e)}"
+            logger.exception(f"Unexpected OpsLevel POST failure {label} error={str(e)}")
+            result["error"] = str(e)
+            return result
+
+        if not retryable or attempt == OPSLEVEL_POST_MAX_ATTEMPTS:
+            logger.error(
+                f"OpsLevel POST failed {label} attempts={attempt} "
+                f"status_code={result.get('status_code')} error={result['error']}"
             )
-            region_errors.append({
-                "region": region_name,
-                "error": str(e)
-            })
+            return result
 
-    logger.info(
-        f"Finished multi-region collection total_clusters={len(all_clusters)} "
-        f"region_errors={len(region_errors)}"
-    )
-    return all_clusters, region_errors
+        delay = random.uniform(0, min(OPSLEVEL_RETRY_MAX_SECONDS, OPSLEVEL_RETRY_BASE_SECONDS * (2 ** (attempt - 1))))
+        logger.warning(
+            f"OpsLevel POST failed {label} attempt={attempt}/{OPSLEVEL_POST_MAX_ATTEMPTS} "
+            f"status_code={result.get('status_code')} error={result['error']}; retrying in {delay:.2f}s"
+        )
+        time.sleep(delay)
 
+    return result
 
-def post_to_opslevel(payload):
+
+def post_to_opslevel(clusters, encoded_clusters, on_chunk_posted=None):
+    """
+    Post the clusters (as encoded by encode_cluster) to OpsLevel in per-region
+    chunks. A failed chunk does not stop the others; the summary lists the
+    outcome of every chunk. on_chunk_posted, if given, is called with the
+    clusters of each delivered chunk.
+    """
     if not OPSLEVEL_WEBHOOK_URL:
         logger.warning("OPSLEVEL_WEBHOOK_URL not set; skipping OpsLevel POST")
         return {"posted": False, "reason": "OPSLEVEL_WEBHOOK_URL not set"}
 
     url = f"{OPSLEVEL_WEBHOOK_URL}?external_kind={OPSLEVEL_EXTERNAL_KIND}"
-    body = json.dumps(payload).encode("utf-8")
+    chunks = build_post_chunks(clusters, encoded_clusters)
 
     logger.info(
         f"Posting payload to OpsLevel external_kind={OPSLEVEL_EXTERNAL_KIND} "
-        f"cluster_count={len(payload.get('clusters', []))}"
+        f"cluster_count={len(clusters)} chunk_count={len(chunks)} gzip={OPSLEVEL_GZIP}"
     )
     logger.debug(f"OpsLevel URL={url}")
-    logger.debug(f"OpsLevel payload={json.dumps(payload, default=str)}")
 
-    req = Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
+    chunk_results = []
+    for chunk_number, (region_name, chunk_items) in enumerate(chunks, start=1):
+        chunk_result = post_chunk(url, chunk_number, region_name, [encoded for _, encoded in chunk_items])
+        chunk_results.append(chunk_result)
+        if chunk_result["posted"] and on_chunk_posted is not None:
+            on_chunk_posted([cluster for cluster, _ in chunk_items])
+    chunks_failed = sum(1 for r in chunk_results if not r["posted"])
+
+    logger.info(
+        f"OpsLevel delivery finished chunk_count={len(chunks)} chunks_failed={chunks_failed}"
     )
+    return {
+        "posted": chunks_failed == 0,
+        "chunk_count": len(chunks),
+        "chunks_failed": chunks_failed,
+        "clusters_posted": sum(r["cluster_count"] for r in chunk_results if r["posted"]),
+        "chunks": chunk_results,
+    }
+
+
+def fingerprint_cluster(cluster, encoded_cluster):
+    """
+    Hash of the cluster's FINGERPRINT_FIELDS, or of the whole encoded cluster.
+    """
+    if FINGERPRINT_FIELDS:
+        encoded_cluster = CLUSTER_ENCODER.encode({field: cluster.get(field) for field in FINGERPRINT_FIELDS})
+    return hashlib.sha256(encoded_cluster.encode("utf-8")).hexdigest()
+
+
+def load_cluster_state(now, event):
+    """
+    Load the delivered-cluster state and decide whether this run is a full resync.
+    Returns (state, full_sync). A state written for another external kind or
+    CLUSTER_FILTER is discarded, since its clusters no longer match this run's.
+    """
+    state = read_state_object(CLUSTER_STATE_URI) or {}
+    scope = {"external_kind": OPSLEVEL_EXTERNAL_KIND, "cluster_filter": CLUSTER_FILTER or None}
+
+    if any(state.get(key) != value for key, value in scope.items()):
+        if state:
+            logger.info("Cluster state was written for a different external kind or CLUSTER_FILTER; starting over")
+        state = {**scope, "clusters": {}, "last_full_sync_at": None}
 
     try:
-        with urlopen(req, timeout=30) as resp:
-            response_body = resp.read().decode("utf-8", errors="replace")
-            logger.info(f"OpsLevel POST succeeded status_code={resp.status}")
-            logger.debug(f"OpsLevel response body={response_body}")
-            return {
-                "posted": True,
-                "status_code": resp.status,
-                "response_body": response_body,
-            }
-    except HTTPError as e:
-        error_body = e.read().decode("utf-8", errors="replace")
-        logger.exception(
-            f"OpsLevel POST failed with HTTPError status_code={e.code} body={error_body}"
-        )
-        return {
-            "posted": False,
-            "status_code": e.code,
-            "error": error_body,
-        }
-    except URLError as e:
-        logger.exception(f"OpsLevel POST failed with URLError error={str(e)}")
-        return {
-            "posted": False,
-            "error": str(e),
+        last_full_sync = datetime.fromisoformat(state["last_full_sync_at"])
+    except (KeyError, TypeError, ValueError):
+        last_full_sync = None
+
+    full_sync = (
+        bool((event or {}).get("full_resync"))
+        or last_full_sync is None
+        or (now - last_full_sync).total_seconds() >= FULL_RESYNC_SECONDS
+    )
+    return state, full_sync
+
+
+def plan_cluster_delta(clusters, encoded_clusters, state, scanned_regions, full_sync):
+    """
+    Compare the collected clusters with the stored fingerprints.
+
+    Returns (clusters to post, their encodings, fingerprints by ARN, summary).
+    On a full sync every cluster is posted. Tombstones are only built for stored
+    clusters of regions scanned successfully in this run, so a failed or skipped
+    region never looks like deleted clusters.
+    """
+    stored = state.get("clusters", {})
+    post_clusters, post_encoded = [], []
+    fingerprints = {}
+    summary = {"mode": "full" if full_sync else "delta", "added": 0, "changed": 0, "unchanged": 0, "removed": 0}
+
+    for cluster, encoded in zip(clusters, encoded_clusters):
+        arn = cluster.get("ARN")
+        if not arn:
+            post_clusters.append(cluster)
+            post_encoded.append(encoded)
+            continue
+
+        fingerprint = fingerprint_cluster(cluster, encoded)
+        fingerprints[arn] = {
+            "fingerprint": fingerprint,
+            "name": cluster.get("Name"),
+            "region": cluster.get("region"),
+            "accountId": cluster.get("accountId"),
         }
-    except Exception as e:
-        logger.exception(f"Unexpected OpsLevel POST failure error={str(e)}")
-        return {
-            "posted": False,
-            "error": str(e),
+        previous = stored.get(arn)
+
+        if previous is None:
+            summary["added"] += 1
+        elif previous.get("fingerprint") != fingerprint:
+            summary["changed"] += 1
+        else:
+            summary["unchanged"] += 1
+            if not full_sync:
+                continue
+        post_clusters.append(cluster)
+        post_encoded.append(encoded)
+
+    for arn, entry in stored.items():
+        if arn in fingerprints or entry.get("region") not in scanned_regions:
+            continue
+        tombstone = {
+            "ARN": arn,
+            "Name": entry.get("name"),
+            "Status": "deleted",
+            "Deleted": True,
+            "Tags": [],
+            "region": entry.get("region"),
+            "accountId": entry.get("accountId"),
         }
+        summary["removed"] += 1
+        post_clusters.append(tombstone)
+        post_encoded.append(encode_cluster(tombstone))
+
+    logger.info(
+        f"Cluster delta mode={summary['mode']} added={summary['added']} changed={summary['changed']} "
+        f"unchanged={summary['unchanged']} removed={summary['removed']} to_post={len(post_clusters)}"
+    )
+    return post_clusters, post_encoded, fingerprints, summary
+
+
+def post_cluster_changes(event, clusters, encoded_clusters, scanned_regions):
+    """
+    Post only the added, changed and removed clusters (or all of them on a full
+    resync), then record the fingerprints of the delivered ones. Clusters in
+    failed chunks keep their previous state and are posted again next run.
+    Returns (OpsLevel result, delta summary).
+    """
+    now = datetime.now(timezone.utc)
+    state, full_sync = load_cluster_state(now, event)
+    post_clusters, post_encoded, fingerprints, summary = plan_cluster_delta(
+        clusters, encoded_clusters, state, scanned_regions, full_sync
+    )
+
+    delivered = []
+    opslevel_result = post_to_opslevel(post_clusters, post_encoded, on_chunk_posted=delivered.extend)
+
+    stored = state["clusters"]
+    for cluster in delivered:
+        arn = cluster.get("ARN")
+        if not arn:
+            continue
+        if cluster.get("Deleted"):
+            stored.pop(arn, None)
+        else:
+            stored[arn] = fingerprints[arn]
+    if full_sync and opslevel_result.get("chunks_failed") == 0:
+        state["last_full_sync_at"] = now.isoformat()
+
+    write_state_object(CLUSTER_STATE_URI, state)
+    return opslevel_result, summary
 
 
 def lambda_handler(event, context):
     logger.info("Lambda invocation started")
-    logger.debug(f"Incoming event={json.dumps(event, default=str)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Incoming event={json.dumps(event, default=str)}")
+
+    use_region_cache = REGION_MODE == "all" and bool(REGION_CACHE_URI)
+    regions_skipped = []
 
     try:
         regions_requested = get_enabled_regions()
-        clusters, region_errors = collect_clusters_across_regions(context, regions_requested)
+        regions_to_scan = regions_requested
+
+        if use_region_cache:
+            now = datetime.now(timezone.utc)
+            region_cache = (read_state_object(REGION_CACHE_URI) or {}).get("regions", {})
+            regions_to_scan, regions_skipped = select_regions_to_scan(regions_requested, region_cache, now)
+
+        clusters, region_errors, region_cluster_counts = collect_clusters_across_regions(context, regions_to_scan)
+
+        if use_region_cache:
+            update_region_cache(region_cache, region_cluster_counts, now)
+            write_state_object(REGION_CACHE_URI, {"regions": region_cache})
     except Exception as e:
         logger.exception(f"Lambda execution failed before payload creation: {str(e)}")
         return {
@@ -295,16 +805,16 @@ def lambda_handler(event, context):
             })
         }
 
-    payload = {
-        "clusters": clusters
-    }
+    # Every cluster is encoded exactly once; the OpsLevel chunks and the result
+    # body below are assembled from these strings.
+    encoded_clusters = [encode_cluster(cluster) for cluster in clusters]
 
     result = {
         "cluster_count": len(clusters),
         "region_mode": REGION_MODE,
         "regions_requested": regions_requested,
+        "regions_skipped": regions_skipped,
         "region_errors": region_errors,
-        "payload": payload,
     }
 
     logger.info(
@@ -313,12 +823,21 @@ def lambda_handler(event, context):
     )
 
     if OPSLEVEL_WEBHOOK_URL:
-        result["opslevel"] = post_to_opslevel(payload)
+        if CLUSTER_STATE_URI:
+            result["opslevel"], result["delta"] = post_cluster_changes(
+                event, clusters, encoded_clusters, set(region_cluster_counts)
+            )
+        else:
+            result["opslevel"] = post_to_opslevel(clusters, encoded_clusters)
+
+    # The result's "payload" is spliced in from the encoded clusters
+    body = encode_result(result, encoded_clusters)
 
     logger.info("Lambda invocation completed successfully")
-    logger.debug(f"Lambda result={json.dumps(result, default=str)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Lambda result={body}")
 
     return {
         "statusCode": 200,
-        "body": json.dumps(result, default=str),
+        "body": body,
     }
\ No newline at end of file
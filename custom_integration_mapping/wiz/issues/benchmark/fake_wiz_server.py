@@ -0,0 +1,246 @@
+"""
+Local stand-in for the Wiz API, used to benchmark get_wiz_issues.py offline.
+
+Serves an OAuth token endpoint (POST /oauth/token) and the `issuesV2` GraphQL
+query (POST /graphql) over a deterministic set of synthetic issues. Page size,
+response latency, error and throttling rates and payload size are configurable.
+
+Run standalone:
+    python fake_wiz_server.py --port 8081 --issues 20000 --latency-ms 200
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+SEVERITIES = ["CRITICAL", "HIGH", "MEDIUM", "LOW"]
+STATUSES = ["OPEN", "IN_PROGRESS", "RESOLVED", "REJECTED"]
+
+
+def make_issue(index: int, entities: int, projects: int, tags_bytes: int, base_time: datetime) -> Dict[str, Any]:
+    """Builds one synthetic issue node shaped like the script's GraphQL query."""
+    entity = index % entities
+    project = index % projects
+    status_changed_at = base_time - timedelta(minutes=index)
+    return {
+        "id": f"issue-{index:08d}",
+        "sourceRules": [{
+            "__typename": "CloudConfigurationRule",
+            "id": f"rule-{index % 97}",
+            "name": f"Synthetic rule {index % 97}",
+            "cloudConfigurationRuleDescription": "Synthetic configuration rule used for benchmarking.",
+            "remediationInstructions": "No action required.",
+            "serviceType": "AWS",
+        }],
+        "createdAt": (status_changed_at - timedelta(days=1)).isoformat().replace("+00:00", "Z"),
+        "updatedAt": status_changed_at.isoformat().replace("+00:00", "Z"),
+        "dueAt": None,
+        "type": "TOXIC_COMBINATION",
+        "resolvedAt": None,
+        "statusChangedAt": status_changed_at.isoformat().replace("+00:00", "Z"),
+        "projects": [{
+            "id": f"project-{project}",
+            "name": f"Project {project}",
+            "slug": f"project-{project}",
+            "businessUnit": f"Unit {project % 3}",
+        }],
+        "status": STATUSES[index % len(STATUSES)],
+        "severity": SEVERITIES[index % len(SEVERITIES)],
+        "entitySnapshot": {
+            "id": f"entity-{entity}",
+            "type": "VIRTUAL_MACHINE",
+            "nativeType": "ec2#instance",
+            "name": f"instance-{entity}",
+            "status": "Active",
+            "cloudPlatform": "AWS",
+            "cloudProviderURL": f"https://console.aws.amazon.com/ec2/v2/home#InstanceDetails:instanceId=i-{entity:012d}",
+            "providerId": f"arn:aws:ec2:us-east-1:123456789012:instance/i-{entity:012d}",
+            "tags": {"team": f"team-{entity % 7}", "blob": "x" * tags_bytes},
+            "externalId": f"i-{entity:012d}",
+        },
+        "serviceTickets": [],
+    }
+
+
+class FakeWiz:
+    """Synthetic issue store plus the request log collected while serving."""
+
+    def __init__(self, issues: int = 10000, entities: int = 500, projects: int = 20, tags_bytes: int = 256,
+                 latency_ms: float = 100.0, per_issue_latency_ms: float = 1.0, error_rate: float = 0.0,
+                 max_page_size: int = 500, seed: int = 42, throttle_rate: float = 0.0, retry_after: float = 1.0):
+        self.latency_ms = latency_ms
+        self.per_issue_latency_ms = per_issue_latency_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.max_page_size = max_page_size
+        self._seed = seed
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        base_time = datetime.now(timezone.utc)
+        self.issues = [make_issue(i, entities, projects, tags_bytes, base_time) for i in range(issues)]
+        self._views: Dict[str, List[Dict[str, Any]]] = {}
+        # (chain key, arrival time, status) per GraphQL request
+        self.requests: List[Tuple[str, float, int]] = []
+
+    def reset(self):
+        """Clears the request log and restarts the error sequence."""
+        with self._lock:
+            self.requests = []
+            self._random = random.Random(self._seed)
+
+    def _view(self, filter_by: Dict[str, Any]) -> List[Dict[str, Any]]:
+        key = json.dumps(filter_by, sort_keys=True)
+        with self._lock:
+            if key not in self._views:
+                severities = filter_by.get("severity")
+                projects = filter_by.get("project")
+                after = (filter_by.get("statusChangedAt") or {}).get("after")
+                self._views[key] = [
+                    issue for issue in self.issues
+                    if (not severities or issue["severity"] in severities)
+                    and (not projects or issue["projects"][0]["id"] in projects)
+                    and (not after or issue["statusChangedAt"] > after)
+                ]
+            return self._views[key]
+
+    def _draw(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def query(self, variables: Dict[str, Any]) -> Tuple[int, Dict[str, Any], float]:
+        """Returns (HTTP status, body, simulated latency in seconds) for one page request."""
+        filter_by = variables.get("filterBy") or {}
+        chain_key = json.dumps(filter_by, sort_keys=True)
+        first = int(variables.get("first") or 50)
+        after = variables.get("after")
+        offset = int(base64.b64decode(after).decode()) if after else 0
+        latency = (self.latency_ms + self.per_issue_latency_ms * first) / 1000.0
+
+        draw = self._draw()
+        if draw < self.error_rate:
+            status, body = 502, {"message": "Bad Gateway"}
+        elif draw < self.error_rate + self.throttle_rate:
+            status, body, latency = 429, {"message": "Too Many Requests"}, 0.0
+        elif first > self.max_page_size:
+            status, body = 200, {"data": None, "errors": [{"message": f"Requested page size {first} exceeds {self.max_page_size}"}]}
+        else:
+            view = self._view(filter_by)
+            nodes = view[offset:offset + first]
+            end = offset + len(nodes)
+            status, body = 200, {"data": {"issues": {
+                "nodes": nodes,
+                "pageInfo": {
+                    "hasNextPage": end < len(view),
+                    "endCursor": base64.b64encode(str(end).encode()).decode(),
+                },
+            }}}
+
+        with self._lock:
+            self.requests.append((chain_key, time.monotonic(), status))
+        return status, body, latency
+
+    def page_latencies(self) -> List[float]:
+        """Seconds between consecutive page requests of the same cursor chain."""
+        by_chain: Dict[str, List[float]] = {}
+        with self._lock:
+            for chain_key, arrived, _ in self.requests:
+                by_chain.setdefault(chain_key, []).append(arrived)
+        gaps = []
+        for arrivals in by_chain.values():
+            gaps.extend(b - a for a, b in zip(arrivals, arrivals[1:]))
+        return gaps
+
+
+def make_handler(fake: FakeWiz):
+    class FakeWizHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: Dict[str, Any]):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            if status == 429:
+                self.send_header("Retry-After", f"{fake.retry_after:g}")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length)
+
+            if self.path.startswith("/oauth/token"):
+                self._reply(200, {"access_token": "fake-wiz-token", "expires_in": 3600, "token_type": "Bearer"})
+                return
+
+            if self.path.startswith("/graphql"):
+                if self.headers.get("Authorization") != "Bearer fake-wiz-token":
+                    self._reply(401, {"message": "Unauthorized"})
+                    return
+                try:
+                    variables = json.loads(raw).get("variables") or {}
+                except json.JSONDecodeError:
+                    self._reply(400, {"message": "Invalid JSON"})
+                    return
+                status, body, latency = fake.query(variables)
+                time.sleep(latency)
+                self._reply(status, body)
+                return
+
+            self._reply(404, {"message": "Not Found"})
+
+    return FakeWizHandler
+
+
+def start_server(fake: FakeWiz, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Starts the server on a background thread. Port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-wiz", daemon=True).start()
+    return server
+
+
+def add_arguments(parser: argparse.ArgumentParser, prefix: str = ""):
+    parser.add_argument(f"--{prefix}issues", type=int, default=10000, help="Number of synthetic issues")
+    parser.add_argument(f"--{prefix}entities", type=int, default=500, help="Number of distinct entities")
+    parser.add_argument(f"--{prefix}projects", type=int, default=20, help="Number of distinct projects")
+    parser.add_argument(f"--{prefix}tags-bytes", type=int, default=256, help="Size of each entity's tags blob")
+    parser.add_argument(f"--{prefix}latency-ms", type=float, default=100.0, help="Base latency per page request")
+    parser.add_argument(f"--{prefix}per-issue-latency-ms", type=float, default=1.0, help="Extra latency per requested issue")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=0.0, help="Fraction of page requests answered with 502")
+    parser.add_argument(f"--{prefix}max-page-size", type=int, default=500, help="Larger pages get a GraphQL error")
+    parser.add_argument(f"--{prefix}throttle-rate", type=float, default=0.0, help="Fraction of page requests answered with 429")
+    parser.add_argument(f"--{prefix}retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429 responses")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Wiz issuesV2 GraphQL API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = FakeWiz(args.issues, args.entities, args.projects, args.tags_bytes, args.latency_ms,
+                   args.per_issue_latency_ms, args.error_rate, args.max_page_size,
+                   throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    server = start_server(fake, args.host, args.port)
+    print(f"Fake Wiz API listening on http://{args.host}:{server.server_address[1]} "
+          f"(token: /oauth/token, GraphQL: /graphql, {args.issues} issues)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
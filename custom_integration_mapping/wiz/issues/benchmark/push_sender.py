@@ -0,0 +1,146 @@
+"""
+Local stand-in for Wiz automation webhooks, used to exercise get_wiz_issues.py --receive.
+
+Posts synthetic issues in the Wiz automation payload format
+({"trigger", "issue", "resource", "control"}) to the push receiver and reports
+throughput and the receiver's answers. Pair it with webhook_sink.py to check that
+every pushed issue reaches the OpsLevel stand-in.
+
+Run standalone:
+    python push_sender.py --url http://127.0.0.1:8091/issues --token secret --issues 5000
+"""
+import argparse
+import gzip
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import requests
+
+import fake_wiz_server
+
+
+def to_automation_payload(node: Dict[str, Any], project_names: bool = False) -> Dict[str, Any]:
+    """
+    Reshapes one synthetic issue node into a Wiz automation webhook payload. The rule
+    keeps its `__typename` and type-specific fields, with its description under
+    `description`. With `project_names`, projects are sent as a comma-separated list
+    of names instead of objects.
+    """
+    rule = dict(node["sourceRules"][0])
+    description_key = next((key for key in rule if key.endswith("Description")), None)
+    if description_key:
+        rule["description"] = rule.pop(description_key)
+    entity = node["entitySnapshot"]
+    projects = ", ".join(p["name"] for p in node["projects"]) if project_names else node["projects"]
+    return {
+        "trigger": {"source": "ISSUES", "type": "Updated", "ruleId": "push-sender", "ruleName": "Push sender"},
+        "issue": {
+            "id": node["id"],
+            "status": node["status"],
+            "severity": node["severity"],
+            "created": node["createdAt"],
+            "updatedAt": node["updatedAt"],
+            "statusChangedAt": node["statusChangedAt"],
+            "dueAt": node["dueAt"],
+            "resolvedAt": node["resolvedAt"],
+            "type": node["type"],
+            "projects": projects,
+            "serviceTickets": node["serviceTickets"],
+        },
+        "resource": {**entity, "tags": [{"key": k, "value": v} for k, v in entity["tags"].items()]},
+        "control": rule,
+    }
+
+
+class PushSender:
+    """Posts payloads in fixed-size requests and counts the receiver's answers."""
+
+    def __init__(self, url: str, token: str, per_request: int = 1, gzip_body: bool = False, rate: float = 0.0):
+        self.url = url
+        self.per_request = max(1, per_request)
+        self.gzip_body = gzip_body
+        self.rate = rate
+        self._session = requests.Session()
+        self._session.headers["Content-Type"] = "application/json"
+        if token:
+            self._session.headers["Authorization"] = f"Bearer {token}"
+        if gzip_body:
+            self._session.headers["Content-Encoding"] = "gzip"
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+        self.statuses: Dict[int, int] = {}
+        self.accepted = 0
+        self.changed = 0
+
+    def _wait_for_slot(self):
+        # Spaces requests evenly across all threads when a rate limit is set
+        if self.rate <= 0:
+            return
+        with self._lock:
+            slot = max(self._next_slot, time.monotonic())
+            self._next_slot = slot + 1.0 / self.rate
+        time.sleep(max(0.0, slot - time.monotonic()))
+
+    def post(self, payloads: List[Dict[str, Any]]):
+        self._wait_for_slot()
+        body = json.dumps(payloads[0] if len(payloads) == 1 else payloads).encode("utf-8")
+        if self.gzip_body:
+            body = gzip.compress(body)
+        try:
+            response = self._session.post(self.url, data=body, timeout=30)
+            status = response.status_code
+            answer = response.json() if status == 202 else {}
+        except (requests.exceptions.RequestException, ValueError):
+            status, answer = 0, {}
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.accepted += answer.get("accepted", 0)
+            self.changed += answer.get("changed", 0)
+
+    def send_all(self, payloads: List[Dict[str, Any]], concurrency: int) -> float:
+        chunks = [payloads[i:i + self.per_request] for i in range(0, len(payloads), self.per_request)]
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            list(executor.map(self.post, chunks))
+        return time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for Wiz automation webhook pushes.")
+    parser.add_argument("--url", default="http://127.0.0.1:8091/issues", help="Push receiver URL")
+    parser.add_argument("--token", default="", help="Bearer token expected by the receiver (WIZ_RECEIVER_TOKEN)")
+    parser.add_argument("--issues", type=int, default=1000, help="Number of synthetic issues to push")
+    parser.add_argument("--entities", type=int, default=500, help="Number of distinct entities")
+    parser.add_argument("--projects", type=int, default=20, help="Number of distinct projects")
+    parser.add_argument("--tags-bytes", type=int, default=256, help="Size of each entity's tags blob")
+    parser.add_argument("--per-request", type=int, default=1, help="Issues per POST (1 mirrors Wiz automations)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent POSTs")
+    parser.add_argument("--rate", type=float, default=0.0, help="Maximum POSTs per second (0 for unlimited)")
+    parser.add_argument("--gzip", action="store_true", help="Send gzip-encoded bodies")
+    parser.add_argument("--project-names", action="store_true", help="Send projects as comma-separated names")
+    args = parser.parse_args()
+
+    base_time = datetime.now(timezone.utc)
+    payloads = [
+        to_automation_payload(fake_wiz_server.make_issue(i, args.entities, args.projects, args.tags_bytes, base_time),
+                              args.project_names)
+        for i in range(args.issues)
+    ]
+    sender = PushSender(args.url, args.token, args.per_request, args.gzip, args.rate)
+    elapsed = sender.send_all(payloads, args.concurrency)
+    print(json.dumps({
+        "issues": args.issues,
+        "accepted": sender.accepted,
+        "changed": sender.changed,
+        "statuses": {str(k): v for k, v in sorted(sender.statuses.items())},
+        "seconds": round(elapsed, 3),
+        "issues_per_second": round(args.issues / elapsed, 1) if elapsed else 0.0,
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Offline benchmark for get_wiz_issues.py.
+
+Starts the fake Wiz API and the webhook sink on local ports, then runs the sync
+script once per mode as a subprocess pointed at them, with its state files in a
+fresh temporary directory. For each mode it reports issues per second, p50/p99
+per-page latency (time between consecutive page requests of a cursor chain, as
+seen by the fake Wiz API) and the peak RSS of the sync process.
+
+Example:
+    python run_benchmark.py --issues 20000 --latency-ms 150 --modes serial,default,sharded
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import fake_wiz_server
+import webhook_sink
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "get_wiz_issues.py")
+
+# Environment overlays per mode, applied on top of the script defaults
+MODES: Dict[str, Dict[str, str]] = {
+    # Closest to the original flow: one uncompressed POST per page, no overlap beyond a single queued page
+    "serial": {
+        "OPSLEVEL_WEBHOOK_SENDERS": "1",
+        "WIZ_SEND_QUEUE_SIZE": "1",
+        "OPSLEVEL_BATCH_MAX_ITEMS": "50",
+        "OPSLEVEL_WEBHOOK_GZIP": "false",
+        "WIZ_ADAPTIVE_PAGE_SIZE": "false",
+    },
+    "default": {},
+    "sharded": {"WIZ_SHARD_BY": "severity"},
+    "streaming": {"WIZ_STREAMING_DECODE": "true"},
+    "normalized": {"OPSLEVEL_PAYLOAD_FORMAT": "normalized"},
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_env(wiz_url: str, sink_url: str, state_dir: str, overlay: Dict[str, str]) -> Dict[str, str]:
+    """Environment for one run. Real Wiz/OpsLevel settings from the caller are never passed through."""
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("WIZ_", "OPSLEVEL_"))}
+    env.update({
+        "WIZ_CLIENT_ID": "benchmark",
+        "WIZ_CLIENT_SECRET": "benchmark",
+        "WIZ_ENDPOINT_URL": f"{wiz_url}/graphql",
+        "WIZ_TOKEN_URL": f"{wiz_url}/oauth/token",
+        "WIZ_TOKEN_AUDIENCE": "wiz-api",
+        "OPSLEVEL_WEBHOOK_UID": "benchmark",
+        "OPSLEVEL_WEBHOOK_BASE_URL": f"{sink_url}/",
+        "WIZ_CONFIG_FILE": os.path.join(state_dir, "config.json"),
+        "WIZ_SPOOL_DIR": os.path.join(state_dir, "spool"),
+        "WIZ_CHECKPOINT_FILE": os.path.join(state_dir, "checkpoint.json"),
+        "WIZ_DEDUP_CACHE_FILE": os.path.join(state_dir, "dedup_cache.json"),
+        "WIZ_TOKEN_CACHE_FILE": os.path.join(state_dir, "token_cache.json"),
+        # A shared lock would make a run skip (and report zero issues) while a real sync holds it
+        "WIZ_LOCK_FILE": os.path.join(state_dir, "sync.lock"),
+    })
+    env.update(overlay)
+    return env
+
+
+def run_mode(name: str, overlay: Dict[str, str], fake: fake_wiz_server.FakeWiz, wiz_url: str,
+             sink: webhook_sink.WebhookSink, sink_url: str, keep_logs: bool) -> Dict[str, Any]:
+    fake.reset()
+    sink.reset()
+
+    with tempfile.TemporaryDirectory(prefix=f"wiz-bench-{name}-") as state_dir:
+        with open(os.path.join(state_dir, "config.json"), "w") as f:
+            json.dump({"status_changed_after": "2000-01-01T00:00:00.000Z"}, f)
+
+        log_path = os.path.join(state_dir, "sync.log")
+        with open(log_path, "w") as log:
+            started = time.monotonic()
+            proc = subprocess.Popen(
+                [sys.executable, SCRIPT_PATH],
+                env=build_env(wiz_url, sink_url, state_dir, overlay),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+            # wait4 reports the resource usage of this child only
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            elapsed = time.monotonic() - started
+
+        if keep_logs or proc.returncode != 0:
+            kept = os.path.join(tempfile.gettempdir(), f"wiz-bench-{name}.log")
+            with open(log_path) as src, open(kept, "w") as dst:
+                dst.write(src.read())
+            print(f"[{name}] Sync log: {kept}")
+
+    received = sink.summary()
+    page_latencies = fake.page_latencies()
+    return {
+        "mode": name,
+        "exit_code": proc.returncode,
+        "seconds": round(elapsed, 3),
+        "issues_delivered": received["unique_issues"],
+        "issues_per_second": round(received["unique_issues"] / elapsed, 1) if elapsed else 0.0,
+        "page_requests": len(fake.requests),
+        "page_p50_ms": round(percentile(page_latencies, 50) * 1000, 1),
+        "page_p99_ms": round(percentile(page_latencies, 99) * 1000, 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "webhook_posts": received["posts"],
+        "webhook_wire_bytes": received["wire_bytes"],
+        "webhook_json_bytes": received["json_bytes"],
+    }
+
+
+def print_table(results: List[Dict[str, Any]]):
+    columns = [
+        ("mode", "mode"), ("exit_code", "exit"), ("seconds", "secs"), ("issues_per_second", "issues/s"),
+        ("page_p50_ms", "p50 ms"), ("page_p99_ms", "p99 ms"), ("peak_rss_mb", "RSS MB"),
+        ("webhook_posts", "posts"), ("webhook_wire_bytes", "wire bytes"),
+    ]
+    widths = [max(len(title), *(len(str(r[key])) for r in results)) for key, title in columns]
+    print("  ".join(title.ljust(w) for (_, title), w in zip(columns, widths)))
+    for r in results:
+        print("  ".join(str(r[key]).ljust(w) for (key, _), w in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark get_wiz_issues.py against local stand-in servers.")
+    parser.add_argument("--modes", default=",".join(MODES), help=f"Comma-separated modes ({', '.join(MODES)})")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment variable for every mode (repeatable)")
+    parser.add_argument("--sink-latency-ms", type=float, default=20.0, help="Webhook sink latency per POST")
+    parser.add_argument("--sink-error-rate", type=float, default=0.0, help="Fraction of POSTs the sink rejects")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--keep-logs", action="store_true", help="Keep each run's sync output")
+    fake_wiz_server.add_arguments(parser)
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"Unknown mode(s): {', '.join(unknown)}")
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    print(f"Generating {args.issues} synthetic issues...")
+    fake = fake_wiz_server.FakeWiz(args.issues, args.entities, args.projects, args.tags_bytes, args.latency_ms,
+                                   args.per_issue_latency_ms, args.error_rate, args.max_page_size,
+                                   throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    sink = webhook_sink.WebhookSink(args.sink_latency_ms, args.sink_error_rate)
+    wiz_server = fake_wiz_server.start_server(fake)
+    sink_server = webhook_sink.start_server(sink)
+    wiz_url = f"http://127.0.0.1:{wiz_server.server_address[1]}"
+    sink_url = f"http://127.0.0.1:{sink_server.server_address[1]}"
+
+    results = []
+    try:
+        for name in modes:
+            print(f"Running mode '{name}'...")
+            results.append(run_mode(name, {**MODES[name], **extra_env}, fake, wiz_url, sink, sink_url, args.keep_logs))
+    finally:
+        wiz_server.shutdown()
+        sink_server.shutdown()
+
+    print()
+    print_table(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+End-to-end check of get_wiz_issues.py --receive against the local stand-ins.
+
+Starts the fake Wiz API and the webhook sink in-process and the receiver daemon as a
+subprocess, waits for its first reconcile poll, then pushes automation payloads with
+push_sender.py and checks what reaches the sink, plus the 400/401/413 answers.
+
+Run:
+    python -m pytest -q benchmark/test_push_receiver.py
+"""
+import gzip
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import pytest
+import requests
+
+import fake_wiz_server
+import push_sender
+import run_benchmark
+import webhook_sink
+
+ISSUES = 300
+TOKEN = "receiver-secret"
+MAX_BYTES = 200000
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(condition, timeout: float = 30.0, message: str = "condition"):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.1)
+    raise AssertionError(f"Timed out waiting for {message}")
+
+
+def raw_post(port: int, headers: str, body: bytes = b"") -> int:
+    """Sends a hand-written request, for headers that requests would refuse to send."""
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as s:
+        s.sendall(f"POST /issues HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {TOKEN}\r\n{headers}\r\n".encode()
+                  + body)
+        return int(s.recv(1024).split(b" ", 2)[1])
+
+
+@pytest.fixture(scope="module")
+def receiver(tmp_path_factory):
+    fake = fake_wiz_server.FakeWiz(issues=ISSUES, latency_ms=0, per_issue_latency_ms=0)
+    sink = webhook_sink.WebhookSink(latency_ms=0)
+    wiz_server = fake_wiz_server.start_server(fake, "127.0.0.1")
+    sink_server = webhook_sink.start_server(sink, "127.0.0.1")
+    state_dir = str(tmp_path_factory.mktemp("receiver"))
+    with open(os.path.join(state_dir, "config.json"), "w") as f:
+        json.dump({"status_changed_after": "2000-01-01T00:00:00.000Z"}, f)
+
+    receiver_port, health_port = free_port(), free_port()
+    env = run_benchmark.build_env(
+        f"http://127.0.0.1:{wiz_server.server_address[1]}",
+        f"http://127.0.0.1:{sink_server.server_address[1]}",
+        state_dir,
+        {
+            "WIZ_RECEIVER_PORT": str(receiver_port),
+            "WIZ_RECEIVER_TOKEN": TOKEN,
+            "WIZ_RECEIVER_FLUSH_SECONDS": "0.2",
+            "WIZ_RECEIVER_MAX_BYTES": str(MAX_BYTES),
+            "WIZ_HEALTH_PORT": str(health_port),
+        },
+    )
+    log = open(os.path.join(state_dir, "receiver.log"), "w")
+    proc = subprocess.Popen([sys.executable, run_benchmark.SCRIPT_PATH, "--receive"], env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+
+    def polled() -> bool:
+        try:
+            return requests.get(f"http://127.0.0.1:{health_port}/healthz", timeout=1).json()["cycles"] >= 1
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            return False
+
+    try:
+        wait_for(polled, message="the first reconcile poll")
+        yield fake, sink, receiver_port
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            log.close()
+            wiz_server.shutdown()
+            sink_server.shutdown()
+
+
+def test_first_poll_delivers_every_issue(receiver):
+    fake, sink, _ = receiver
+    assert sink.issue_ids == {issue["id"] for issue in fake.issues}
+
+
+@pytest.mark.parametrize("project_names", [False, True])
+def test_push_of_polled_issues_is_not_redelivered(receiver, project_names):
+    fake, sink, port = receiver
+    posts = sink.summary()["posts"]
+    sender = push_sender.PushSender(f"http://127.0.0.1:{port}/issues", TOKEN, per_request=25, gzip_body=project_names)
+    sender.send_all([push_sender.to_automation_payload(issue, project_names) for issue in fake.issues], concurrency=4)
+    assert sender.statuses == {202: ISSUES // 25}
+    assert sender.accepted == ISSUES
+    assert sender.changed == 0
+    time.sleep(0.5)
+    assert sink.summary()["posts"] == posts
+
+
+def test_new_pushes_are_delivered(receiver):
+    _, sink, port = receiver
+    base_time = datetime.now(timezone.utc)
+    new = [fake_wiz_server.make_issue(ISSUES + i, 50, 5, 64, base_time) for i in range(40)]
+    sender = push_sender.PushSender(f"http://127.0.0.1:{port}/issues", TOKEN, per_request=1)
+    sender.send_all([push_sender.to_automation_payload(issue) for issue in new], concurrency=4)
+    assert sender.statuses == {202: 40}
+    assert sender.changed == 40
+    new_ids = {issue["id"] for issue in new}
+    wait_for(lambda: new_ids <= sink.issue_ids, message="the pushed issues to reach the sink")
+
+
+def test_rejects_wrong_token(receiver):
+    _, _, port = receiver
+    response = requests.post(f"http://127.0.0.1:{port}/issues", data=b"{}", timeout=10,
+                             headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize("content_length", ["-1", "abc", "1e3"])
+def test_rejects_invalid_content_length(receiver, content_length):
+    _, _, port = receiver
+    assert raw_post(port, f"Content-Length: {content_length}\r\n") == 400
+
+
+def test_rejects_malformed_body(receiver):
+    _, _, port = receiver
+    for body, headers in ((b"{not json", {}), (b"\x1f\x8bnot gzip", {"Content-Encoding": "gzip"})):
+        response = requests.post(f"http://127.0.0.1:{port}/issues", data=body, timeout=10,
+                                 headers={"Authorization": f"Bearer {TOKEN}", **headers})
+        assert response.status_code == 400
+
+
+def test_rejects_oversized_body(receiver):
+    _, _, port = receiver
+    assert raw_post(port, f"Content-Length: {MAX_BYTES + 1}\r\n") == 413
+
+
+def test_rejects_gzip_bomb(receiver):
+    _, _, port = receiver
+    bomb = gzip.compress(b"[" + b" " * (MAX_BYTES * 50) + b"]")
+    assert len(bomb) < MAX_BYTES
+    response = requests.post(f"http://127.0.0.1:{port}/issues", data=bomb, timeout=10,
+                             headers={"Authorization": f"Bearer {TOKEN}", "Content-Encoding": "gzip"})
+    assert response.status_code == 413
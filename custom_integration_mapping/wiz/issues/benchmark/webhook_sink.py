@@ -0,0 +1,133 @@
+"""
+Local stand-in for the OpsLevel custom webhook, used to benchmark get_wiz_issues.py offline.
+
+Accepts POST /<webhook uid>?external_kind=... with plain or gzip-encoded JSON in
+either payload format (an array of issues, or the normalized
+{"entities", "projects", "issues"} object) and records what it receives.
+
+Run standalone:
+    python webhook_sink.py --port 8082
+"""
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Set
+
+
+class WebhookSink:
+    """Counters for everything the sink has received."""
+
+    def __init__(self, latency_ms: float = 20.0, error_rate: float = 0.0, seed: int = 7):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self._seed = seed
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears all counters."""
+        with self._lock:
+            self._random = random.Random(self._seed)
+            self.posts = 0
+            self.rejected = 0
+            self.wire_bytes = 0
+            self.json_bytes = 0
+            self.issues = 0
+            self.issue_ids: Set[str] = set()
+            self.last_payload: Any = None
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def receive(self, body: bytes, content_encoding: str) -> int:
+        """Records one POST and returns the HTTP status to answer with."""
+        time.sleep(self.latency_ms / 1000.0)
+        if self._should_fail():
+            with self._lock:
+                self.rejected += 1
+            return 503
+
+        raw = gzip.decompress(body) if content_encoding == "gzip" else body
+        payload = json.loads(raw)
+        issues: List[Dict[str, Any]] = payload.get("issues", []) if isinstance(payload, dict) else payload
+
+        with self._lock:
+            self.posts += 1
+            self.wire_bytes += len(body)
+            self.json_bytes += len(raw)
+            self.issues += len(issues)
+            self.issue_ids.update(issue.get("id") for issue in issues if isinstance(issue, dict))
+            self.last_payload = payload
+        return 202
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "posts": self.posts,
+                "rejected": self.rejected,
+                "wire_bytes": self.wire_bytes,
+                "json_bytes": self.json_bytes,
+                "issues": self.issues,
+                "unique_issues": len(self.issue_ids),
+            }
+
+
+def make_handler(sink: WebhookSink):
+    class WebhookSinkHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            try:
+                status = sink.receive(body, self.headers.get("Content-Encoding", ""))
+            except (OSError, ValueError) as e:
+                status = 400
+                print(f"Webhook sink: Rejected malformed body: {e}")
+            data = json.dumps({"result": "ok" if status < 300 else "error"}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return WebhookSinkHandler
+
+
+def start_server(sink: WebhookSink, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Starts the sink on a background thread. Port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), make_handler(sink))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="webhook-sink", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpsLevel custom webhook.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Latency per POST")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of POSTs answered with 503")
+    args = parser.parse_args()
+
+    sink = WebhookSink(args.latency_ms, args.error_rate)
+    server = start_server(sink, args.host, args.port)
+    print(f"Webhook sink listening on http://{args.host}:{server.server_address[1]}/")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"Webhook sink: {json.dumps(sink.summary())}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,209 @@
 import requests
+import argparse
+import glob
+import gzip
+import hashlib
+import hmac
+import itertools
 import json
 import os
+import queue
+import random
+import re
+import shutil
+import signal
 import sys
-from typing import Optional, Dict, List, Any
-from datetime import datetime, timezone 
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Any, Tuple, Callable, Iterator
+from datetime import datetime, timedelta, timezone 
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from requests.adapters import HTTPAdapter
+
+try:
+    # Optional: only needed for WIZ_STREAMING_DECODE
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    # POSIX only; without it the lock file is not enforced
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # --- Configuration ---
 # Global authentication and endpoint URLs (used for validation/setup)
 AUTH0_URLS = ['https://auth.wiz.io/oauth/token', 'https://auth0.gov.wiz.io/oauth/token', 'https://auth0.test.wiz.io/oauth/token', 'https://auth0.demo.wiz.io/oauth/token']
 COGNITO_URLS = ['https://auth.app.wiz.io/oauth/token', 'https://auth.gov.wiz.io/oauth/token', 'https://auth.test.wiz.io/oauth/token', 'https://auth.demo.wiz.io/oauth/token']
+# OAuth audience for token URLs not listed above (e.g. a local stand-in server)
+TOKEN_AUDIENCE = os.getenv("WIZ_TOKEN_AUDIENCE")
 
 # Standard headers
 HEADERS_AUTH = {"Content-Type": "application/x-www-form-urlencoded"}
 HEADERS = {"Content-Type": "application/json"}
 
-# Define page size for pagination
-PAGE_SIZE = 50 
+# Define page size for pagination (initial size when adaptive sizing is enabled)
+PAGE_SIZE = int(os.getenv("WIZ_PAGE_SIZE", "50"))
+
+# Decode `data.issues.nodes` incrementally and hand each node to the batcher as it
+# arrives, instead of building the whole response in memory (requires `ijson`)
+STREAMING_DECODE = os.getenv("WIZ_STREAMING_DECODE", "false").strip().lower() in ("1", "true", "yes")
+
+# --- Adaptive Page Sizing ---
+# Grow or shrink `first` at runtime, within these bounds, to keep page latency near the target
+ADAPTIVE_PAGE_SIZE = os.getenv("WIZ_ADAPTIVE_PAGE_SIZE", "true").strip().lower() in ("1", "true", "yes")
+PAGE_SIZE_MIN = max(1, int(os.getenv("WIZ_PAGE_SIZE_MIN", "10")))
+PAGE_SIZE_MAX = max(PAGE_SIZE_MIN, int(os.getenv("WIZ_PAGE_SIZE_MAX", "500")))
+PAGE_TARGET_SECONDS = float(os.getenv("WIZ_PAGE_TARGET_SECONDS", "2.0"))
+PAGE_MAX_BYTES = int(os.getenv("WIZ_PAGE_MAX_BYTES", "5000000"))
+
+# --- Pipeline Configuration ---
+# Number of threads draining the send queue and posting batches to OpsLevel
+WEBHOOK_SENDER_THREADS = max(1, int(os.getenv("OPSLEVEL_WEBHOOK_SENDERS", "4")))
+# Maximum number of batches buffered between the Wiz fetcher and the senders
+SEND_QUEUE_MAX_BATCHES = max(1, int(os.getenv("WIZ_SEND_QUEUE_SIZE", "8")))
+
+# Shared HTTP sessions so connections are reused across pages and sender threads
+WIZ_SESSION = requests.Session()
+WEBHOOK_SESSION = requests.Session()
+WEBHOOK_SESSION.mount("https://", HTTPAdapter(pool_maxsize=WEBHOOK_SENDER_THREADS))
+
+# --- Retry Policy (Wiz API and OpsLevel webhook requests) ---
+# Connect/read timeout per HTTP request
+HTTP_TIMEOUT_SECONDS = float(os.getenv("WIZ_HTTP_TIMEOUT_SECONDS", "60"))
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Backoff before retry n is drawn from [0, min(max delay, base * 2^(n-1))]; Retry-After raises it
+RETRY_BASE_SECONDS = float(os.getenv("WIZ_RETRY_BASE_SECONDS", "1.0"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("WIZ_RETRY_MAX_DELAY_SECONDS", "60"))
+WIZ_RETRY_MAX_ATTEMPTS = max(1, int(os.getenv("WIZ_RETRY_MAX_ATTEMPTS", "5")))
+WIZ_RETRY_MAX_TOTAL_SECONDS = float(os.getenv("WIZ_RETRY_MAX_TOTAL_SECONDS", "300"))
+WEBHOOK_RETRY_MAX_ATTEMPTS = max(1, int(os.getenv("OPSLEVEL_RETRY_MAX_ATTEMPTS", "5")))
+WEBHOOK_RETRY_MAX_TOTAL_SECONDS = float(os.getenv("OPSLEVEL_RETRY_MAX_TOTAL_SECONDS", "120"))
+# ------------------------------------------------------------
 
 # --- OpsLevel Webhook Configuration (Configurable via Environment Variables) ---
-OPSLEVEL_WEBHOOK_BASE_URL = "https://app.opslevel.com/integrations/custom/webhook/"
+OPSLEVEL_WEBHOOK_BASE_URL = os.getenv("OPSLEVEL_WEBHOOK_BASE_URL", "https://app.opslevel.com/integrations/custom/webhook/")
 WEBHOOK_UID = os.getenv("OPSLEVEL_WEBHOOK_UID")
 EXTERNAL_KIND = os.getenv("OPSLEVEL_EXTERNAL_KIND", "wiz_issues") 
+
+# Issues from several pages are merged into one POST up to these limits
+# (the byte limit applies to the uncompressed JSON body)
+WEBHOOK_BATCH_MAX_ITEMS = max(1, int(os.getenv("OPSLEVEL_BATCH_MAX_ITEMS", "500")))
+WEBHOOK_BATCH_MAX_BYTES = max(1, int(os.getenv("OPSLEVEL_BATCH_MAX_BYTES", "1000000")))
+# Webhook body format: "nodes" (a JSON array of issues) or "normalized" (each distinct
+# entity and project sent once per batch, referenced from the issues by ID)
+PAYLOAD_FORMAT = os.getenv("OPSLEVEL_PAYLOAD_FORMAT", "nodes").strip().lower()
+# Send webhook bodies gzip-compressed (Content-Encoding: gzip)
+WEBHOOK_GZIP = os.getenv("OPSLEVEL_WEBHOOK_GZIP", "true").strip().lower() in ("1", "true", "yes")
 # --------------------------------------------------------------------------
 
 # --- Configuration File ---
-CONFIG_FILE = "config.json"
+CONFIG_FILE = os.getenv("WIZ_CONFIG_FILE", "config.json")
+# With a "tenants" list in the config file, each tenant keeps its state files in <dir>/<name>/
+TENANT_STATE_DIR = os.getenv("WIZ_TENANT_STATE_DIR", "tenants")
+# Maximum number of tenants synced concurrently
+TENANT_CONCURRENCY = max(1, int(os.getenv("WIZ_TENANT_CONCURRENCY", "4")))
+TENANT_NAME_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]*")
+# Tenant settings and the environment variables they default to
+SETTING_ENV_VARS = {
+    "client_id": "WIZ_CLIENT_ID",
+    "client_secret": "WIZ_CLIENT_SECRET",
+    "endpoint_url": "WIZ_ENDPOINT_URL",
+    "token_url": "WIZ_TOKEN_URL",
+    "webhook_uid": "OPSLEVEL_WEBHOOK_UID",
+    "external_kind": "OPSLEVEL_EXTERNAL_KIND",
+}
+# Settings required to sync, and to only send to OpsLevel (spool drain, archive replay)
+SYNC_SETTINGS = ("client_id", "client_secret", "endpoint_url", "token_url", "webhook_uid")
+WEBHOOK_SETTINGS = ("webhook_uid",)
+# The next watermark is the highest `statusChangedAt` fetched, minus this overlap
+# (covers issues Wiz indexes with a slight delay; re-fetched issues are deduplicated)
+WATERMARK_OVERLAP_SECONDS = max(0.0, float(os.getenv("WIZ_WATERMARK_OVERLAP_SECONDS", "300")))
 # --------------------------
 
+# --- Wiz Token Cache ---
+TOKEN_CACHE_FILE = os.getenv("WIZ_TOKEN_CACHE_FILE", "token_cache.json")
+# Refresh the cached token this many seconds before it expires
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("WIZ_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Lifetime assumed when the token response carries no expires_in
+TOKEN_DEFAULT_EXPIRES_IN = 3600
+# -----------------------
+
+# --- Pagination Checkpoint (resume point for interrupted runs) ---
+CHECKPOINT_FILE = os.getenv("WIZ_CHECKPOINT_FILE", "checkpoint.json")
+# ------------------------------------------------------------------
+
+# --- Sharded Fetch ---
+# Split the query into independent cursor chains, e.g. "severity", "project" or "severity,project"
+SHARD_BY = [dim.strip().lower() for dim in os.getenv("WIZ_SHARD_BY", "").split(",") if dim.strip()]
+# Wiz project IDs used for "project" sharding
+SHARD_PROJECT_IDS = [pid.strip() for pid in os.getenv("WIZ_PROJECT_IDS", "").split(",") if pid.strip()]
+# Maximum number of shards fetched concurrently
+SHARD_CONCURRENCY = max(1, int(os.getenv("WIZ_SHARD_CONCURRENCY", "4")))
+# ---------------------
+
+# --- Delivery Dedup Cache (skip issues already delivered unchanged) ---
+DEDUP_ENABLED = os.getenv("WIZ_DEDUP_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+DEDUP_CACHE_FILE = os.getenv("WIZ_DEDUP_CACHE_FILE", "dedup_cache.json")
+# Entries not seen for this long are evicted
+DEDUP_TTL_DAYS = float(os.getenv("WIZ_DEDUP_TTL_DAYS", "30"))
+# Resolved/rejected issues are evicted sooner, since they rarely change again
+DEDUP_RESOLVED_TTL_HOURS = float(os.getenv("WIZ_DEDUP_RESOLVED_TTL_HOURS", "24"))
+DEDUP_CLOSED_STATUSES = ("RESOLVED", "REJECTED")
+# ----------------------------------------------------------------------
+
+# --- Webhook Spool (dead-letter storage for undelivered batches) ---
+SPOOL_DIR = os.getenv("WIZ_SPOOL_DIR", "spool")
+# Delivery attempts per spooled batch when the spool is replayed
+SPOOL_REPLAY_ATTEMPTS = max(1, int(os.getenv("WIZ_SPOOL_REPLAY_ATTEMPTS", "3")))
+# -------------------------------------------------------------------
+
+# --- Page Archive (gzip NDJSON copy of every fetched page, re-sent by --replay) ---
+# Unset disables the archive; with tenants configured each tenant archives to <dir>/<name>/
+ARCHIVE_DIR = os.getenv("WIZ_ARCHIVE_DIR")
+# Start a new segment once the current one holds this many uncompressed bytes
+ARCHIVE_SEGMENT_MAX_BYTES = max(1, int(os.getenv("WIZ_ARCHIVE_SEGMENT_MAX_BYTES", "67108864")))
+# Delete segments older than this many days when a new segment is started (0 keeps all)
+ARCHIVE_RETENTION_DAYS = float(os.getenv("WIZ_ARCHIVE_RETENTION_DAYS", "0"))
+# ---------------------------------------------------------------------------------
+
+# --- Metrics Export ---
+# Prometheus textfile (for the node exporter's textfile collector) and/or JSON summary
+METRICS_TEXTFILE = os.getenv("WIZ_METRICS_TEXTFILE")
+METRICS_JSON_FILE = os.getenv("WIZ_METRICS_JSON")
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+# ----------------------
+
+# --- Daemon Mode (--daemon) ---
+# Time between the starts of consecutive sync cycles
+DAEMON_INTERVAL_SECONDS = max(1.0, float(os.getenv("WIZ_DAEMON_INTERVAL_SECONDS", "60")))
+# Held for the whole run (or the daemon's lifetime) so syncs never overlap
+LOCK_FILE = os.getenv("WIZ_LOCK_FILE", "sync.lock")
+# Local /healthz and /metrics endpoint of the daemon (port 0 disables it)
+HEALTH_HOST = os.getenv("WIZ_HEALTH_HOST", "127.0.0.1")
+HEALTH_PORT = int(os.getenv("WIZ_HEALTH_PORT", "8090"))
+# /healthz reports unhealthy after this many consecutive failed cycles
+HEALTH_MAX_FAILURES = max(1, int(os.getenv("WIZ_HEALTH_MAX_FAILURES", "3")))
+# ------------------------------
+
+# --- Push Receiver (--receive) ---
+# Endpoint for Wiz automation webhooks; anything but a loopback address requires a token
+RECEIVER_HOST = os.getenv("WIZ_RECEIVER_HOST", "127.0.0.1")
+RECEIVER_PORT = int(os.getenv("WIZ_RECEIVER_PORT", "8091"))
+RECEIVER_TOKEN = os.getenv("WIZ_RECEIVER_TOKEN")
+RECEIVER_MAX_BYTES = max(1, int(os.getenv("WIZ_RECEIVER_MAX_BYTES", "10000000")))
+# Partial batches of pushed issues are sent after at most this long
+RECEIVER_FLUSH_SECONDS = max(0.1, float(os.getenv("WIZ_RECEIVER_FLUSH_SECONDS", "5")))
+# Polling runs as a reconcile at this interval while the receiver is active
+RECONCILE_INTERVAL_SECONDS = max(1.0, float(os.getenv("WIZ_RECONCILE_INTERVAL_SECONDS", "3600")))
+# ---------------------------------
+
 def get_config_path(file_name: str) -> str:
     """Calculates the absolute path to the configuration file relative to the script's directory."""
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -57,72 +234,924 @@ def load_config(file_name: str) -> Dict[str, Any]:
         print(f"Error reading configuration file '{file_path}': {e}")
         return {}
 
-def update_config(file_name: str):
+def utc_now_iso() -> str:
+    """Returns the current UTC time in ISO 8601 format, e.g. 2024-05-15T14:30:00.000Z."""
+    return datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+def parse_wiz_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parses an ISO 8601 timestamp as returned by Wiz (e.g. 2024-05-15T14:30:00.123Z) into an aware datetime."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def format_wiz_timestamp(value: datetime) -> str:
+    """Formats an aware datetime in the config file's format, e.g. 2024-05-15T14:30:00.123Z."""
+    return value.astimezone(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+def next_watermark(previous: str, max_status_changed_at: Optional[str], overlap_seconds: float = WATERMARK_OVERLAP_SECONDS) -> str:
+    """
+    Derives the next 'status_changed_after' from the data instead of the wall clock:
+    the highest `statusChangedAt` fetched minus the overlap, never moving backwards.
+    """
+    previous_dt = parse_wiz_timestamp(previous)
+    latest_dt = parse_wiz_timestamp(max_status_changed_at)
+    if latest_dt is None:
+        return previous
+    candidate = latest_dt - timedelta(seconds=overlap_seconds)
+    if previous_dt is not None and candidate <= previous_dt:
+        return previous
+    return format_wiz_timestamp(candidate)
+
+def atomic_write_json(file_path: str, data: Any, mode: int = 0o666):
+    """
+    Writes JSON to a temporary file next to `file_path` and renames it into place,
+    so readers only ever see the old or the new content, even after a crash.
+    `mode` is applied (subject to the umask) when the temporary file is created.
+    """
+    tmp_path = f"{file_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode), 'w') as f:
+        json.dump(data, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+class SyncMetrics:
+    """
+    Thread-safe counters, gauges and histograms for the sync stages, exported as a
+    Prometheus textfile and/or a JSON summary at the end of a run.
+    """
+
+    HELP = {
+        "wiz_sync_fetch_latency_seconds": "Wiz GraphQL page request latency.",
+        "wiz_sync_decode_seconds": "Time spent decoding Wiz GraphQL responses.",
+        "wiz_sync_webhook_latency_seconds": "OpsLevel webhook POST latency.",
+        "wiz_sync_send_queue_depth": "Batches waiting in the send queue when a batch is enqueued.",
+        "wiz_sync_bytes_in_total": "Bytes received from the Wiz API.",
+        "wiz_sync_bytes_out_total": "Webhook body bytes sent to OpsLevel.",
+        "wiz_sync_retries_total": "Retries by stage.",
+        "wiz_sync_pages_total": "Wiz pages fetched.",
+        "wiz_sync_issues_fetched_total": "Issues returned by the Wiz API.",
+        "wiz_sync_issues_skipped_total": "Issues skipped as unchanged by the dedup cache.",
+        "wiz_sync_issues_sent_total": "Issues delivered to OpsLevel.",
+        "wiz_sync_batches_total": "Webhook batches by outcome.",
+        "wiz_sync_token_refreshes_total": "Wiz access tokens fetched.",
+        "wiz_sync_runs_total": "Sync runs by outcome.",
+        "wiz_sync_push_requests_total": "Push receiver requests by HTTP status.",
+        "wiz_sync_push_issues_total": "Issues received by the push receiver.",
+        "wiz_sync_tenant_last_run_success": "1 if the tenant's last sync completed, 0 otherwise.",
+        "wiz_sync_run_duration_seconds": "Duration of the last run.",
+        "wiz_sync_last_run_success": "1 if the last run completed, 0 otherwise.",
+        "wiz_sync_last_run_timestamp_seconds": "Unix time the last run finished.",
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._gauges: Dict[Tuple[str, Tuple], float] = {}
+        # (name, labels) -> [bucket bounds, bucket counts, sum, count]
+        self._histograms: Dict[Tuple[str, Tuple], List[Any]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple]:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, buckets: Tuple = LATENCY_BUCKETS, **labels: str):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [buckets, [0] * len(buckets), 0.0, 0])
+            for i, bound in enumerate(histogram[0]):
+                if value <= bound:
+                    histogram[1][i] += 1
+            histogram[2] += value
+            histogram[3] += 1
+
+    @staticmethod
+    def _labels(labels: Tuple, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in labels] + ([extra] if extra else [])
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            typed = set()
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                for (name, labels), value in sorted(series.items()):
+                    if name not in typed:
+                        typed.add(name)
+                        lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+                        lines.append(f"# TYPE {name} {kind}")
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+            for (name, labels), (bounds, counts, total, count) in sorted(self._histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+                    lines.append(f"# TYPE {name} histogram")
+                for bound, bucket_count in zip(bounds, counts):
+                    lines.append(f"{name}_bucket{self._labels(labels, 'le=' + json.dumps(str(bound)))} {bucket_count}")
+                lines.append(f"{name}_bucket{self._labels(labels, 'le=' + json.dumps('+Inf'))} {count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {total}")
+                lines.append(f"{name}_count{self._labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        def series_name(name: str, labels: Tuple) -> str:
+            return name + self._labels(labels)
+
+        with self._lock:
+            return {
+                "counters": {series_name(n, l): v for (n, l), v in sorted(self._counters.items())},
+                "gauges": {series_name(n, l): v for (n, l), v in sorted(self._gauges.items())},
+                "histograms": {
+                    series_name(n, l): {
+                        "count": count,
+                        "sum": round(total, 6),
+                        "mean": round(total / count, 6) if count else 0.0,
+                        "buckets": {str(bound): c for bound, c in zip(bounds, counts)},
+                    }
+                    for (n, l), (bounds, counts, total, count) in sorted(self._histograms.items())
+                },
+            }
+
+    def write(self, textfile: Optional[str] = METRICS_TEXTFILE, json_file: Optional[str] = METRICS_JSON_FILE):
+        """Writes the configured exports atomically; does nothing if none is configured."""
+        try:
+            if textfile:
+                tmp_path = f"{textfile}.tmp"
+                with open(tmp_path, 'w') as f:
+                    f.write(self.to_prometheus())
+                os.replace(tmp_path, textfile)
+                print(f"Metrics written to '{textfile}'.")
+            if json_file:
+                atomic_write_json(json_file, self.to_dict())
+                print(f"Metrics summary written to '{json_file}'.")
+        except IOError as e:
+            print(f"Warning: Failed to write metrics: {e}")
+
+METRICS = SyncMetrics()
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header (delay in seconds or an HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter for transient HTTP failures.
+
+    Connection errors, timeouts and RETRYABLE_STATUS_CODES responses are retried up
+    to `max_attempts` attempts in total. A `Retry-After` header sets the minimum
+    delay, and no retry is scheduled past `max_total_seconds` after the first attempt.
+    """
+
+    def __init__(self, stage: str, max_attempts: int, max_total_seconds: float,
+                 base_delay: float = RETRY_BASE_SECONDS, max_delay: float = RETRY_MAX_DELAY_SECONDS):
+        self.stage = stage
+        self.max_attempts = max_attempts
+        self.max_total_seconds = max_total_seconds
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before the retry following attempt number `attempt` (1-based)."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def call(self, send: Callable[[], requests.Response], label: str = "") -> requests.Response:
+        """
+        Calls `send` until it returns a non-retryable response or the attempts or time
+        budget run out. Returns the last response, or re-raises the last connection error.
+        """
+        deadline = time.monotonic() + self.max_total_seconds
+        attempt = 0
+        while True:
+            attempt += 1
+            response = None
+            retry_after = None
+            try:
+                response = send()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_attempts:
+                    raise
+                error = e
+                reason = f"{type(e).__name__}"
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_attempts:
+                    return response
+                reason = f"HTTP {response.status_code}"
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+
+            delay = self.backoff_delay(attempt, retry_after)
+            if time.monotonic() + delay > deadline:
+                print(f"{label}Retry ({self.stage}): {reason}. Giving up after {attempt} attempt(s), "
+                      f"the next retry would exceed the {self.max_total_seconds:.0f}s budget.")
+                if response is None:
+                    raise error
+                return response
+
+            if response is not None:
+                response.close()
+            METRICS.inc("wiz_sync_retries_total", stage=self.stage)
+            print(f"{label}Retry ({self.stage}): {reason}. Retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_attempts}).")
+            time.sleep(delay)
+
+WIZ_RETRY = RetryPolicy("wiz_api", WIZ_RETRY_MAX_ATTEMPTS, WIZ_RETRY_MAX_TOTAL_SECONDS)
+WEBHOOK_RETRY = RetryPolicy("webhook", WEBHOOK_RETRY_MAX_ATTEMPTS, WEBHOOK_RETRY_MAX_TOTAL_SECONDS)
+
+def write_config_keys(file_name: str, updates: Dict[str, Any], remove: Optional[List[str]] = None):
+    """
+    Sets and removes keys in the configuration file, preserving all other keys.
+    """
+    file_path = get_config_path(file_name)
+
+    # Load the existing config (to preserve any other keys)
+    config = {}
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as f:
+            try:
+                config = json.load(f)
+            except json.JSONDecodeError:
+                pass # Ignore corruption, will overwrite timestamp
+
+    config.update(updates)
+    for key in remove or []:
+        config.pop(key, None)
+
+    # Write the updated config back to the file
+    atomic_write_json(file_path, config)
+
+def update_config(file_name: str, new_timestamp: Optional[str] = None, label: str = ""):
     """
     Updates the 'status_changed_after' key in the configuration file 
-    to the current UTC timestamp (ISO 8601 format).
+    to the given timestamp, or the current UTC timestamp (ISO 8601 format).
+    Any pending watermark is cleared.
     """
     file_path = get_config_path(file_name)
 
     try:
-        # Format: 2024-05-15T14:30:00.000Z
-        new_timestamp = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+        new_timestamp = new_timestamp or utc_now_iso()
+        write_config_keys(file_name, {'status_changed_after': new_timestamp}, remove=['pending_status_changed_after'])
+        print(f"\n{label}Configuration file updated successfully. Next run will fetch issues changed after: {new_timestamp}")
         
-        # Load the existing config (to preserve any other keys)
-        config = {}
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                try:
-                    config = json.load(f)
-                except json.JSONDecodeError:
-                    pass # Ignore corruption, will overwrite timestamp
+    except Exception as e:
+        print(f"\nWarning: Failed to update config file '{file_path}': {e}")
+
+def set_pending_watermark(file_name: str, new_timestamp: Optional[str] = None, label: str = ""):
+    """
+    Records the watermark a run would have committed had every batch been delivered.
+    It is promoted to 'status_changed_after' once the spool has been drained.
+    """
+    file_path = get_config_path(file_name)
+
+    try:
+        new_timestamp = new_timestamp or utc_now_iso()
+        write_config_keys(file_name, {'pending_status_changed_after': new_timestamp})
+        print(f"\n{label}Undelivered batches remain in the spool. Watermark {new_timestamp} is pending until the spool is drained.")
 
-        # Update the timestamp
-        config['status_changed_after'] = new_timestamp
-        
-        # Write the updated config back to the file
-        with open(file_path, 'w') as f:
-            json.dump(config, f, indent=4)
-        
-        print(f"\nConfiguration file updated successfully. Next run will fetch issues changed after: {new_timestamp}")
-        
     except Exception as e:
         print(f"\nWarning: Failed to update config file '{file_path}': {e}")
 
-def send_to_webhook(data: List[Dict[str, Any]], webhook_uid: str, external_kind: str):
+class CheckpointStore:
+    """
+    Checkpoint file holding the resume point of every shard, keyed by shard name.
+    Each update rewrites the file atomically.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._shards: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'r') as f:
+                    self._shards = json.load(f).get("shards", {})
+            except (json.JSONDecodeError, IOError, AttributeError) as e:
+                print(f"Warning: Ignoring unreadable checkpoint '{file_path}': {e}")
+
+    def get(self, shard_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._shards.get(shard_key)
+
+    def put(self, shard_key: str, state: Dict[str, Any]):
+        with self._lock:
+            self._shards[shard_key] = state
+            try:
+                atomic_write_json(self.file_path, {"shards": self._shards})
+            except IOError as e:
+                print(f"Warning: Failed to write checkpoint '{self.file_path}': {e}")
+
+    def clear(self):
+        """Deletes the checkpoint file once every shard has been fully delivered."""
+        with self._lock:
+            self._shards = {}
+            if os.path.exists(self.file_path):
+                os.remove(self.file_path)
+
+class PaginationCheckpoint:
+    """
+    Persists the resume point of one paginated cursor chain (shard).
+
+    A page is acknowledged once every batch holding its issues has been delivered
+    or spooled. After each acknowledged page the page's `endCursor`, the page count,
+    the issue count and the filter set are written atomically, so an interrupted run
+    can resume with the next page instead of starting over.
+
+    It also tracks the highest `statusChangedAt` among the shard's fetched issues
+    (including those fetched before a resume), from which the next watermark is derived.
+    """
+
+    def __init__(self, store: CheckpointStore, shard_key: str, filter_set: Dict[str, Any]):
+        self.store = store
+        self.shard_key = shard_key
+        self.filter_set = filter_set
+        self.max_status_changed_at: Optional[str] = None
+        self._max_dt: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._created = 0
+        self._done: set = set()
+        self._done_through = 0
+        # (batches that must be done, page, cursor, issues) in page order
+        self._milestones: deque = deque()
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Returns the stored resume point if it was written for the same filter set."""
+        checkpoint = self.store.get(self.shard_key)
+        if not checkpoint:
+            return None
+        if checkpoint.get("filter_set") != self.filter_set:
+            print(f"Checkpoint for '{self.shard_key}' was written for a different filter set. Starting from the first page.")
+            return None
+        self._observe_timestamp(checkpoint.get("max_status_changed_at"))
+        return checkpoint
+
+    def _observe_timestamp(self, value: Optional[str]):
+        parsed = parse_wiz_timestamp(value)
+        if parsed is not None and (self._max_dt is None or parsed > self._max_dt):
+            self._max_dt = parsed
+            self.max_status_changed_at = value
+
+    def observe(self, nodes: List[Dict[str, Any]]):
+        """Tracks the highest `statusChangedAt` among fetched issue nodes."""
+        with self._lock:
+            for node in nodes:
+                self._observe_timestamp(node.get("statusChangedAt"))
+
+    def batch_created(self) -> int:
+        """Registers a new batch and returns its sequence number."""
+        with self._lock:
+            self._created += 1
+            return self._created
+
+    def page_completed(self, page: int, cursor: Optional[str], issues: int):
+        """
+        Marks every issue up to and including `page` as handed to the batches created
+        so far; the page is acknowledged once those batches are done.
+        """
+        with self._lock:
+            self._milestones.append((self._created, page, cursor, issues))
+            self._commit_acknowledged()
+
+    def batch_done(self, seq: int):
+        """Records that a batch was delivered or spooled."""
+        with self._lock:
+            self._done.add(seq)
+            while self._done_through + 1 in self._done:
+                self._done_through += 1
+                self._done.remove(self._done_through)
+            self._commit_acknowledged()
+
+    def _commit_acknowledged(self):
+        latest = None
+        while self._milestones and self._milestones[0][0] <= self._done_through:
+            latest = self._milestones.popleft()
+        if latest is None:
+            return
+        _, page, cursor, issues = latest
+        self.store.put(self.shard_key, {
+            "filter_set": self.filter_set,
+            "after": cursor,
+            "page_count": page,
+            "issues": issues,
+            # May include pages not yet acknowledged; they are fetched again on resume
+            "max_status_changed_at": self.max_status_changed_at,
+            "updated_at": utc_now_iso(),
+        })
+
+    def unacknowledged(self) -> int:
+        """Number of batches created but neither delivered nor spooled."""
+        with self._lock:
+            return self._created - self._done_through - len(self._done)
+
+    def mark_completed(self):
+        """Records that the cursor chain has been fully delivered, so a resumed run skips it."""
+        state = dict(self.store.get(self.shard_key) or {"filter_set": self.filter_set})
+        state["completed"] = True
+        state["max_status_changed_at"] = self.max_status_changed_at
+        self.store.put(self.shard_key, state)
+
+class DeliveryDedupCache:
     """
-    Sends the retrieved issue nodes for a single page to the OpsLevel webhook endpoint.
+    Local store of the issues already delivered to OpsLevel, keyed by issue `id`
+    and holding a hash of the issue's queried fields.
+
+    Issues whose hash matches the stored one are skipped. Hashes are only recorded
+    once the batch carrying the issue has been delivered or spooled.
+    """
+
+    def __init__(self, file_path: str, enabled: bool = DEDUP_ENABLED):
+        self.file_path = file_path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # id -> (hash, status, source) of issues handed to the senders but not yet acknowledged
+        self._pending: Dict[str, Tuple[str, Optional[str], str]] = {}
+        if enabled:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.file_path):
+            return
+        try:
+            with open(self.file_path, 'r') as f:
+                self._entries = json.load(f).get("issues", {})
+        except (json.JSONDecodeError, IOError, AttributeError) as e:
+            print(f"Warning: Ignoring unreadable dedup cache '{self.file_path}': {e}")
+            self._entries = {}
+
+    @staticmethod
+    def hash_issue(node: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(node, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+    def filter_changed(self, nodes: List[Dict[str, Any]], source: str = "poll") -> List[Dict[str, Any]]:
+        """
+        Returns the nodes that are new or changed since they were last delivered.
+        The returned nodes are pending until acknowledged, tagged with `source` ("poll" or "push").
+        """
+        if not self.enabled:
+            return nodes
+
+        now = utc_now_iso()
+        changed = []
+        with self._lock:
+            for node in nodes:
+                issue_id = node.get("id")
+                if not issue_id:
+                    changed.append(node)
+                    continue
+                issue_hash = self.hash_issue(node)
+                entry = self._entries.get(issue_id)
+                if entry and entry.get("hash") == issue_hash:
+                    entry["seen_at"] = now
+                    continue
+                if self._pending.get(issue_id, (None,))[0] == issue_hash:
+                    continue
+                self._pending[issue_id] = (issue_hash, node.get("status"), source)
+                changed.append(node)
+        return changed
+
+    def discard_pending(self, source: str = "poll"):
+        """
+        Forgets issues from `source` handed to the senders but never acknowledged
+        (e.g. after a failed shard), so a cache reused across runs does not skip them.
+        Pending issues of other sources, such as push batches still being sent, are kept.
+        """
+        with self._lock:
+            self._pending = {issue_id: p for issue_id, p in self._pending.items() if p[2] != source}
+
+    def release(self, nodes: List[Dict[str, Any]]):
+        """Forgets the pending issues of a batch that was neither delivered nor spooled."""
+        with self._lock:
+            for node in nodes:
+                self._pending.pop(node.get("id"), None)
+
+    def mark_delivered(self, nodes: List[Dict[str, Any]]):
+        """Records the hashes of a delivered (or spooled) batch."""
+        if not self.enabled:
+            return
+
+        now = utc_now_iso()
+        with self._lock:
+            for node in nodes:
+                pending = self._pending.pop(node.get("id"), None)
+                if pending:
+                    self._entries[node["id"]] = {"hash": pending[0], "status": pending[1], "seen_at": now}
+
+    def evict(self) -> int:
+        """Drops aged-out entries and resolved entries past their shorter TTL."""
+        now = datetime.now(timezone.utc)
+        stale_before = now - timedelta(days=DEDUP_TTL_DAYS)
+        closed_before = now - timedelta(hours=DEDUP_RESOLVED_TTL_HOURS)
+        evicted = []
+        with self._lock:
+            for issue_id, entry in self._entries.items():
+                try:
+                    seen_at = datetime.fromisoformat(entry["seen_at"].replace('Z', '+00:00'))
+                except (KeyError, ValueError, AttributeError):
+                    evicted.append(issue_id)
+                    continue
+                if seen_at < stale_before or (entry.get("status") in DEDUP_CLOSED_STATUSES and seen_at < closed_before):
+                    evicted.append(issue_id)
+            for issue_id in evicted:
+                del self._entries[issue_id]
+        return len(evicted)
+
+    def save(self):
+        """Evicts old entries and atomically writes the cache."""
+        if not self.enabled:
+            return
+        evicted = self.evict()
+        try:
+            with self._lock:
+                atomic_write_json(self.file_path, {"issues": self._entries})
+            print(f"Dedup cache saved with {len(self._entries)} issue(s) ({evicted} evicted).")
+        except IOError as e:
+            print(f"Warning: Failed to write dedup cache '{self.file_path}': {e}")
+
+class WebhookSpool:
+    """
+    On-disk spool of webhook batches that could not be delivered.
+
+    Batches are appended as NDJSON lines to a segment file owned by this process.
+    Replaying closes that segment, so later batches start a new one, then re-sends
+    the batches of every closed segment in order and deletes each segment once all
+    its batches were delivered. It stops at the first batch that
+    cannot be delivered; that segment is atomically cut down to its undelivered
+    tail and the later segments are left for the next replay.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._segment_path: Optional[str] = None
+
+    def _segment_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "segment-*.ndjson")))
+
+    def append(self, nodes: List[Dict[str, Any]], webhook_uid: str, external_kind: str):
+        """Durably appends one undelivered batch to the current segment."""
+        record = {
+            "spooled_at": utc_now_iso(),
+            "webhook_uid": webhook_uid,
+            "external_kind": external_kind,
+            "nodes": nodes,
+        }
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._segment_path is None:
+                os.makedirs(self.directory, exist_ok=True)
+                stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+                self._segment_path = os.path.join(self.directory, f"segment-{stamp}-{os.getpid()}.ndjson")
+            path = self._segment_path
+            with open(path, "a") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        METRICS.inc("wiz_sync_batches_total", outcome="spooled")
+        print(f"Spool: Stored {len(nodes)} undelivered issues in '{path}'.")
+
+    def is_empty(self) -> bool:
+        """True when no segment holds undelivered batches."""
+        return not any(os.path.getsize(path) > 0 for path in self._segment_files())
+
+    def replay(self, attempts: int = SPOOL_REPLAY_ATTEMPTS) -> bool:
+        """
+        Re-sends the spooled batches in order, retrying each up to `attempts` times
+        (on top of the webhook retry policy of every send). Stops at the first batch
+        that still fails, so an OpsLevel outage costs one batch's retries per run.
+        Returns True when the spool is empty afterwards.
+        """
+        with self._lock:
+            # A long-running process keeps one spool; close its segment so its batches are replayed too
+            self._segment_path = None
+            segments = self._segment_files()
+        if not segments:
+            return self.is_empty()
+
+        print(f"Spool: Replaying {len(segments)} segment(s) from '{self.directory}'...")
+        delivered = 0
+        for index, path in enumerate(segments):
+            with open(path, "r") as f:
+                for line in iter(f.readline, ""):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-write; nothing to recover
+                        print(f"Spool: Skipping unreadable record in '{path}'.")
+                        continue
+
+                    if self._send_record(record, attempts):
+                        delivered += 1
+                        continue
+
+                    self._keep_tail(path, line, f)
+                    print(f"Spool: Replay stopped at a batch OpsLevel did not accept. Delivered {delivered} batch(es); "
+                          f"the rest of '{path}' and {len(segments) - index - 1} later segment(s) are kept for the next replay.")
+                    return False
+            os.remove(path)
+
+        print(f"Spool: Replay finished. Delivered {delivered} batch(es).")
+        return self.is_empty()
+
+    @staticmethod
+    def _send_record(record: Dict[str, Any], attempts: int) -> bool:
+        for attempt in range(1, attempts + 1):
+            if send_to_webhook(record["nodes"], record["webhook_uid"], record["external_kind"]):
+                return True
+            if attempt < attempts:
+                METRICS.inc("wiz_sync_retries_total", stage="spool_replay")
+                time.sleep(WEBHOOK_RETRY.backoff_delay(attempt))
+        return False
+
+    @staticmethod
+    def _keep_tail(path: str, first_line: str, rest):
+        """Atomically replaces the segment with `first_line` and the unread rest of the file."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as out:
+            out.write(first_line)
+            shutil.copyfileobj(rest, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, path)
+
+class PageArchive:
+    """
+    Append-only archive of fetched Wiz pages in gzip-compressed NDJSON segments.
+
+    Each line holds the nodes of one page (or, with streaming decode, of one node)
+    together with the shard and the time it was fetched. The current segment is
+    sync-flushed after every record, so it stays readable up to its last complete
+    record even if the process dies; segments are rotated by size and optionally
+    pruned by age. `iter_nodes` reads every segment back in fetch order.
+    """
+
+    def __init__(self, directory: str, max_segment_bytes: int = ARCHIVE_SEGMENT_MAX_BYTES,
+                 retention_days: float = ARCHIVE_RETENTION_DAYS):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._segment: Optional[gzip.GzipFile] = None
+        self._segment_bytes = 0
+
+    def segment_files(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "pages-*.ndjson.gz")))
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.retention_days > 0:
+            cutoff = time.time() - self.retention_days * 86400
+            for path in self.segment_files():
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    print(f"Archive: Removed expired segment '{path}'.")
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        path = os.path.join(self.directory, f"pages-{stamp}-{os.getpid()}.ndjson.gz")
+        self._segment = gzip.open(path, "ab", compresslevel=6)
+        self._segment_bytes = 0
+
+    def append(self, shard_key: str, page: int, nodes: List[Dict[str, Any]]):
+        """Archives the nodes of one fetched page."""
+        if not nodes:
+            return
+        record = {"fetched_at": utc_now_iso(), "shard": shard_key, "page": page, "nodes": nodes}
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            if self._segment is None or self._segment_bytes >= self.max_segment_bytes:
+                self._close_segment()
+                self._open_segment()
+            self._segment.write(line)
+            self._segment.flush()
+            self._segment_bytes += len(line)
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def close(self):
+        """Completes the current segment; the next append starts a new one."""
+        with self._lock:
+            self._close_segment()
+
+    def iter_nodes(self) -> Iterator[Dict[str, Any]]:
+        """Yields every archived node, oldest segment first."""
+        for path in self.segment_files():
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            print(f"Archive: Skipping unreadable record in '{path}'.")
+                            continue
+                        yield from record.get("nodes", [])
+            except (EOFError, OSError) as e:
+                # A segment cut off by a crash is readable up to its last flushed record
+                print(f"Archive: Segment '{path}' ends early ({e}). Using the records read so far.")
+
+class WebhookBatcher:
+    """
+    Merges issue nodes from consecutive pages into webhook batches bounded by an
+    item count and by the size of the serialized JSON body.
+    """
+
+    def __init__(self, max_items: int = WEBHOOK_BATCH_MAX_ITEMS, max_bytes: int = WEBHOOK_BATCH_MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._nodes: List[Dict[str, Any]] = []
+        self._bytes = 2  # enclosing "[]"
+        # Page of the oldest node still waiting in the pending batch
+        self.first_pending_page: Optional[int] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return not self._nodes
+
+    def add(self, nodes: List[Dict[str, Any]], page: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Adds nodes to the pending batch and returns any batches that are now full."""
+        ready = []
+        for node in nodes:
+            # Node size plus its separating comma
+            size = len(json.dumps(node, separators=(",", ":")).encode("utf-8")) + 1
+            if self._nodes and self._bytes + size > self.max_bytes:
+                ready.append(self._take())
+            if not self._nodes:
+                self.first_pending_page = page
+            self._nodes.append(node)
+            self._bytes += size
+            if len(self._nodes) >= self.max_items:
+                ready.append(self._take())
+        return ready
+
+    def flush(self) -> List[List[Dict[str, Any]]]:
+        """Returns the pending partial batch, if any."""
+        return [self._take()] if self._nodes else []
+
+    def _take(self) -> List[Dict[str, Any]]:
+        batch = self._nodes
+        self._nodes = []
+        self._bytes = 2
+        self.first_pending_page = None
+        return batch
+
+def normalize_batch(nodes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Rewrites a batch so that each distinct `entitySnapshot` and project appears once.
+
+    Issues keep all other fields and reference their entity and projects through
+    `entitySnapshotId` and `projectIds`:
+    {"entities": [...], "projects": [...], "issues": [{..., "entitySnapshotId": ..., "projectIds": [...]}]}
+    """
+    entities: Dict[str, Dict[str, Any]] = {}
+    projects: Dict[str, Dict[str, Any]] = {}
+    issues = []
+    for node in nodes:
+        issue = {k: v for k, v in node.items() if k not in ("entitySnapshot", "projects")}
+
+        entity = node.get("entitySnapshot")
+        issue["entitySnapshotId"] = entity.get("id") if entity else None
+        if entity and entity.get("id") is not None:
+            entities.setdefault(entity["id"], entity)
+
+        issue["projectIds"] = []
+        for project in node.get("projects") or []:
+            if project.get("id") is not None:
+                projects.setdefault(project["id"], project)
+                issue["projectIds"].append(project["id"])
+        issues.append(issue)
+
+    return {
+        "entities": list(entities.values()),
+        "projects": list(projects.values()),
+        "issues": issues,
+    }
+
+def encode_webhook_body(data: List[Dict[str, Any]]) -> bytes:
+    """Serializes a batch in the configured payload format to compact JSON, gzip-compressed when enabled."""
+    payload = normalize_batch(data) if PAYLOAD_FORMAT == "normalized" else data
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    if WEBHOOK_GZIP:
+        body = gzip.compress(body, compresslevel=6)
+    return body
+
+def send_to_webhook(data: List[Dict[str, Any]], webhook_uid: str, external_kind: str) -> bool:
+    """
+    Sends a batch of issue nodes to the OpsLevel webhook endpoint.
+    Returns True when OpsLevel accepted the batch.
     """
     if not data:
-        return
+        return True
 
     webhook_url = f"{OPSLEVEL_WEBHOOK_BASE_URL}{webhook_uid}?external_kind={external_kind}"
+    headers = {"Content-Type": "application/json"}
+    if WEBHOOK_GZIP:
+        headers["Content-Encoding"] = "gzip"
+
+    def post() -> requests.Response:
+        started = time.monotonic()
+        try:
+            return WEBHOOK_SESSION.post(
+                webhook_url, 
+                data=body, 
+                headers=headers,
+                timeout=HTTP_TIMEOUT_SECONDS
+            )
+        finally:
+            METRICS.observe("wiz_sync_webhook_latency_seconds", time.monotonic() - started)
+            METRICS.inc("wiz_sync_bytes_out_total", len(body))
 
     try:
-        response = requests.post(
-            webhook_url, 
-            json=data, 
-            headers={"Content-Type": "application/json"}
-        )
+        body = encode_webhook_body(data)
+        # Retries 429/5xx responses and connection errors with backoff, honoring Retry-After
+        response = WEBHOOK_RETRY.call(post, label="Webhook: ")
         response.raise_for_status()
-        print(f"Webhook: Successfully sent {len(data)} issues to UID '{webhook_uid}' with external_kind '{external_kind}'. Status: {response.status_code}")
+        METRICS.inc("wiz_sync_batches_total", outcome="sent")
+        METRICS.inc("wiz_sync_issues_sent_total", len(data))
+        print(f"Webhook: Successfully sent {len(data)} issues ({len(body)} bytes) to UID '{webhook_uid}' with external_kind '{external_kind}'. Status: {response.status_code}")
+        return True
     except requests.exceptions.RequestException as e:
+        METRICS.inc("wiz_sync_batches_total", outcome="failed")
         print(f"Webhook-Error: Failed to send data to OpsLevel: {e}")
-        # Note: Implement retry logic or a dead-letter queue here if required.
+        return False
+
+def _post_wiz_query(data: Dict[str, Any], endpoint_url: str, stats: Dict[str, Any],
+                    token_provider: Optional["WizTokenProvider"] = None, stream: bool = False) -> requests.Response:
+    """
+    Posts one GraphQL request under the Wiz retry policy. With a `token_provider`,
+    a 401 is retried once with a fresh token. `stats["started"]` is set to the start
+    of the final attempt, so backoff delays are not counted as page latency.
+    """
+    def post() -> requests.Response:
+        stats["started"] = time.monotonic()
+        headers = token_provider.headers() if token_provider else HEADERS
+        result = WIZ_SESSION.post(url=endpoint_url, json=data, headers=headers, stream=stream, timeout=HTTP_TIMEOUT_SECONDS)
+        if result.status_code == 401 and token_provider:
+            print("Wiz-API: Token rejected (401). Refreshing token and retrying once.")
+            METRICS.inc("wiz_sync_retries_total", stage="wiz_auth")
+            result.close()
+            token_provider.invalidate()
+            result = WIZ_SESSION.post(url=endpoint_url, json=data, headers=token_provider.headers(), stream=stream, timeout=HTTP_TIMEOUT_SECONDS)
+        return result
+
+    return WIZ_RETRY.call(post, label="Wiz-API: ")
 
-def query_wiz_api(query: str, variables: dict, endpoint_url: str) -> Dict[str, Any]:
+def query_wiz_api(query: str, variables: dict, endpoint_url: str, stats: Optional[Dict[str, Any]] = None,
+                  token_provider: Optional["WizTokenProvider"] = None) -> Dict[str, Any]:
     """
     Query WIZ API for the given query data schema.
+
+    If `stats` is given, it is filled with the response `latency` (seconds), the
+    response size in `bytes` and whether the response carried `graphql_errors`.
+    With a `token_provider`, the request uses its (proactively refreshed) token and
+    is retried once with a fresh token after a 401. Transient failures (429, 5xx,
+    connection errors) are retried per WIZ_RETRY before {} is returned.
     """
     data = {"variables": variables, "query": query}
+    stats = stats if stats is not None else {}
 
     try:
-        result = requests.post(url=endpoint_url, json=data, headers=HEADERS)
+        result = _post_wiz_query(data, endpoint_url, stats, token_provider)
+        stats["latency"] = time.monotonic() - stats.pop("started")
+        stats["bytes"] = len(result.content)
+        METRICS.observe("wiz_sync_fetch_latency_seconds", stats["latency"])
+        METRICS.inc("wiz_sync_bytes_in_total", stats["bytes"])
         result.raise_for_status()
         
+        decode_started = time.monotonic()
         response_json = result.json()
+        METRICS.observe("wiz_sync_decode_seconds", time.monotonic() - decode_started)
 
         if response_json.get("errors"):
+            stats["graphql_errors"] = True
             print("Wiz-API-Error: GraphQL Errors found in response:")
             print(json.dumps(response_json["errors"], indent=4))
             return {}
@@ -139,8 +1168,100 @@ def query_wiz_api(query: str, variables: dict, endpoint_url: str) -> Dict[str, A
         print(f"Wiz-API-Error: An unexpected error occurred - {e}")
         return {}
 
-def request_wiz_api_token(client_id: str, client_secret: str, token_url: str) -> str:
-    """Retrieve an OAuth access token to be used against Wiz API"""
+class _CountingReader:
+    """File-like wrapper counting the bytes read from a streamed response."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._raw.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+def query_wiz_api_streaming(query: str, variables: dict, endpoint_url: str, on_node: Callable[[Dict[str, Any]], None],
+                            stats: Optional[Dict[str, Any]] = None, token_provider: Optional["WizTokenProvider"] = None) -> Dict[str, Any]:
+    """
+    Streaming variant of query_wiz_api.
+
+    Each element of `data.issues.nodes` is decoded incrementally and passed to
+    `on_node` as soon as it is complete, so only one node is held in memory at a
+    time. The returned response has the same shape as query_wiz_api's, with
+    `pageInfo` populated and an empty `nodes` list; it is {} on errors. Nodes decoded
+    before an `errors` member have already been passed to `on_node`.
+    """
+    data = {"variables": variables, "query": query}
+    stats = stats if stats is not None else {}
+
+    try:
+        # Retries happen before any node is decoded, so none is handed to `on_node` twice
+        result = _post_wiz_query(data, endpoint_url, stats, token_provider, stream=True)
+
+        with result:
+            result.raise_for_status()
+            result.raw.decode_content = True
+            reader = _CountingReader(result.raw)
+
+            has_data = False
+            page_info: Dict[str, Any] = {}
+            errors = None
+            builder = None
+            building = None
+            # Time spent downstream of the decoder, excluded from the decode time
+            downstream = 0.0
+            decode_started = time.monotonic()
+            for prefix, event, value in ijson.parse(reader, use_float=True):
+                if builder is not None:
+                    builder.event(event, value)
+                    if prefix == building and event in ("end_map", "end_array"):
+                        if building == "data.issues.nodes.item":
+                            handed_off = time.monotonic()
+                            on_node(builder.value)
+                            downstream += time.monotonic() - handed_off
+                        elif building == "data.issues.pageInfo":
+                            page_info = builder.value
+                        else:
+                            errors = builder.value
+                        builder = None
+                    continue
+
+                if prefix == "data" and event == "start_map":
+                    has_data = True
+                elif (prefix, event) in (("data.issues.nodes.item", "start_map"), ("data.issues.pageInfo", "start_map"), ("errors", "start_array")):
+                    building = prefix
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+
+            # Back-pressure from the senders is not Wiz latency; it must not shrink the page size
+            stats["latency"] = time.monotonic() - stats.pop("started") - downstream
+            stats["bytes"] = reader.bytes_read
+            METRICS.observe("wiz_sync_fetch_latency_seconds", stats["latency"])
+            METRICS.observe("wiz_sync_decode_seconds", time.monotonic() - decode_started - downstream)
+            METRICS.inc("wiz_sync_bytes_in_total", stats["bytes"])
+
+        if errors:
+            stats["graphql_errors"] = True
+            print("Wiz-API-Error: GraphQL Errors found in response:")
+            print(json.dumps(errors, indent=4))
+            return {}
+        if not has_data:
+            return {}
+
+        return {"data": {"issues": {"nodes": [], "pageInfo": page_info}}}
+
+    except requests.exceptions.RequestException as e:
+        print(f"Wiz-API-Error: Request failed - {e}")
+        return {}
+    except ijson.JSONError as e:
+        print(f"Wiz-API-Error: Failed to decode JSON response - {e}")
+        return {}
+    except Exception as e:
+        print(f"Wiz-API-Error: An unexpected error occurred - {e}")
+        return {}
+
+def fetch_wiz_api_token(client_id: str, client_secret: str, token_url: str) -> Tuple[str, int]:
+    """Retrieve an OAuth access token and its lifetime in seconds from the Wiz token endpoint"""
     if token_url in AUTH0_URLS:
         auth_payload = {
             'grant_type': 'client_credentials',
@@ -155,11 +1276,18 @@ def request_wiz_api_token(client_id: str, client_secret: str, token_url: str) ->
             'client_id': client_id,
             'client_secret': client_secret
         }
+    elif TOKEN_AUDIENCE:
+        auth_payload = {
+            'grant_type': 'client_credentials',
+            'audience': TOKEN_AUDIENCE,
+            'client_id': client_id,
+            'client_secret': client_secret
+        }
     else:
         raise Exception('Invalid Token URL')
 
     try:
-        response = requests.post(url=token_url, headers=HEADERS_AUTH, data=auth_payload)
+        response = requests.post(url=token_url, headers=HEADERS_AUTH, data=auth_payload, timeout=HTTP_TIMEOUT_SECONDS)
         response.raise_for_status()
     except requests.exceptions.RequestException as e:
         raise Exception(f'Error authenticating to Wiz: {e}')
@@ -173,10 +1301,89 @@ def request_wiz_api_token(client_id: str, client_secret: str, token_url: str) ->
             raise Exception(message)
     except ValueError:
         raise Exception('Could not parse API response for token')
-    
-    # Update global HEADDERS with the Authorization token
-    HEADERS["Authorization"] = "Bearer " + TOKEN
-    return TOKEN
+
+    try:
+        expires_in = int(response_json.get('expires_in') or TOKEN_DEFAULT_EXPIRES_IN)
+    except (TypeError, ValueError):
+        expires_in = TOKEN_DEFAULT_EXPIRES_IN
+    return TOKEN, expires_in
+
+class WizTokenProvider:
+    """
+    Caches the Wiz access token together with its expiry, in memory and in a
+    private on-disk cache shared by consecutive runs.
+
+    The token is refreshed proactively once it is within TOKEN_REFRESH_MARGIN_SECONDS
+    of expiring, or immediately after `invalidate()` (e.g. following a 401).
+    """
+
+    def __init__(self, client_id: str, client_secret: str, token_url: str, cache_file: Optional[str] = None,
+                 refresh_margin: int = TOKEN_REFRESH_MARGIN_SECONDS):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url
+        self.cache_file = cache_file
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._load_cache()
+
+    def _load_cache(self):
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                cached = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return
+        try:
+            # Never reuse a token issued for other credentials or another auth endpoint
+            if cached.get("client_id") == self.client_id and cached.get("token_url") == self.token_url:
+                token, expires_at = cached.get("access_token"), float(cached.get("expires_at", 0))
+                self._token, self._expires_at = token, expires_at
+        except (TypeError, ValueError, AttributeError) as e:
+            print(f"Warning: Ignoring unreadable token cache '{self.cache_file}': {e}")
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        try:
+            atomic_write_json(self.cache_file, {
+                "client_id": self.client_id,
+                "token_url": self.token_url,
+                "access_token": self._token,
+                "expires_at": self._expires_at,
+            }, mode=0o600)
+        except IOError as e:
+            print(f"Warning: Failed to write token cache '{self.cache_file}': {e}")
+
+    @property
+    def is_valid(self) -> bool:
+        return bool(self._token) and time.time() < self._expires_at - self.refresh_margin
+
+    def get_token(self) -> str:
+        """Returns a token that is not about to expire, fetching a new one if needed."""
+        with self._lock:
+            if not self.is_valid:
+                token, expires_in = fetch_wiz_api_token(self.client_id, self.client_secret, self.token_url)
+                self._token = token
+                self._expires_at = time.time() + expires_in
+                self._save_cache()
+                METRICS.inc("wiz_sync_token_refreshes_total")
+                print(f"Wiz token refreshed (valid for {expires_in}s).")
+            return self._token
+
+    def invalidate(self):
+        """Forces the next `get_token()` to fetch a new token."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    def headers(self) -> Dict[str, str]:
+        """Request headers for the Wiz GraphQL API, including a valid bearer token."""
+        # Never written to the global HEADERS: each tenant has its own provider and token
+        return {**HEADERS, "Authorization": "Bearer " + self.get_token()}
 
 def get_issues_query() -> str:
     """
@@ -262,98 +1469,545 @@ def get_issues_query() -> str:
         }
         """
 
-def fetch_all_issues(query: str, initial_variables: Dict[str, Any], endpoint_url: str, webhook_uid: str, external_kind: str) -> int:
+class PageSizeController:
     """
-    Fetches issues from the Wiz API using cursor-based pagination and sends each page 
-    of results to the configured webhook.
+    Adapts the GraphQL `first` argument to what the Wiz tenant serves fastest.
+
+    After each page the size is scaled towards the latency target (growing by at
+    most 50% and shrinking by at most 50% per step), pages larger than the byte
+    limit shrink it, and GraphQL errors halve it so the page can be retried.
+    The size always stays within [minimum, maximum].
+    """
+
+    def __init__(self, initial: int = PAGE_SIZE, minimum: int = PAGE_SIZE_MIN, maximum: int = PAGE_SIZE_MAX,
+                 target_seconds: float = PAGE_TARGET_SECONDS, max_bytes: int = PAGE_MAX_BYTES, enabled: bool = ADAPTIVE_PAGE_SIZE,
+                 label: str = ""):
+        self.enabled = enabled
+        self.label = label
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self.size = min(max(initial, minimum), maximum) if enabled else initial
+
+    def _resize(self, new_size: int, reason: str):
+        new_size = min(max(new_size, self.minimum), self.maximum)
+        if new_size != self.size:
+            print(f"{self.label}Page size: {self.size} -> {new_size} ({reason})")
+            self.size = new_size
+
+    def record_page(self, latency: float, response_bytes: int):
+        """Adjusts the size after a successful page."""
+        if not self.enabled or latency <= 0:
+            return
+
+        reason = f"latency {latency:.2f}s, {response_bytes / 1024:.0f} KiB"
+        if response_bytes > self.max_bytes:
+            self._resize(int(self.size * self.max_bytes / response_bytes), reason)
+            return
+
+        # Scale towards the target latency, bounded to one step of 0.5x..1.5x
+        factor = min(max(self.target_seconds / latency, 0.5), 1.5)
+        if factor > 1.1 or factor < 0.8:
+            self._resize(int(self.size * factor), reason)
+
+    def shrink_after_error(self) -> bool:
+        """Halves the size after a GraphQL error. Returns False if already at the minimum."""
+        if not self.enabled or self.size <= self.minimum:
+            return False
+        self._resize(self.size // 2, "GraphQL error")
+        return True
+
+def webhook_sender(send_queue: "queue.Queue[Optional[Tuple[Optional[PaginationCheckpoint], int, List[Dict[str, Any]]]]]", webhook_uid: str, external_kind: str, spool: WebhookSpool, dedup: DeliveryDedupCache):
+    """
+    Consumer stage: drains batches from the send queue and posts them to the webhook
+    until it receives the None sentinel. Batches that cannot be delivered are spooled.
+    Pushed batches carry no checkpoint.
+    """
+    while True:
+        item = send_queue.get()
+        try:
+            if item is None:
+                return
+            checkpoint, seq, nodes = item
+            try:
+                if not send_to_webhook(nodes, webhook_uid, external_kind):
+                    spool.append(nodes, webhook_uid, external_kind)
+            except Exception as e:
+                # Keep the sender alive; the batch stays unacknowledged so the checkpoint stops before it,
+                # and its issues are no longer pending so a later poll or push sends them again
+                print(f"Webhook-Error: Unexpected error while delivering batch {seq}: {e}")
+                dedup.release(nodes)
+                continue
+            dedup.mark_delivered(nodes)
+            if checkpoint is not None:
+                checkpoint.batch_done(seq)
+        finally:
+            send_queue.task_done()
+
+def build_shards(initial_variables: Dict[str, Any], shard_by: Optional[List[str]] = None) -> List[Tuple[str, Dict[str, Any]]]:
     """
+    Splits the query variables into independent shards, one per combination of the
+    configured dimensions ("severity" uses the severities in filterBy.severity,
+    "project" uses WIZ_PROJECT_IDS). Returns (shard key, variables) pairs.
+    """
+    shard_by = SHARD_BY if shard_by is None else shard_by
+    filter_by = initial_variables.get("filterBy", {})
+
+    dimensions = []
+    for dimension in shard_by:
+        if dimension == "severity" and filter_by.get("severity"):
+            dimensions.append([("severity", [severity]) for severity in filter_by["severity"]])
+        elif dimension == "project" and SHARD_PROJECT_IDS:
+            dimensions.append([("project", [project_id]) for project_id in SHARD_PROJECT_IDS])
+        else:
+            print(f"Warning: Cannot shard by '{dimension}'. Ignoring it.")
+
+    if not dimensions:
+        return [("all", initial_variables)]
+
+    shards = []
+    for combination in itertools.product(*dimensions):
+        variables = json.loads(json.dumps(initial_variables))
+        for field, value in combination:
+            variables.setdefault("filterBy", {})[field] = value
+        key = ",".join(f"{field}={value[0]}" for field, value in combination)
+        shards.append((key, variables))
+    return shards
+
+def fetch_shard(shard_key: str, query: str, initial_variables: Dict[str, Any], endpoint_url: str,
+                send_queue: "queue.Queue[Optional[Tuple[PaginationCheckpoint, int, List[Dict[str, Any]]]]]",
+                checkpoint: PaginationCheckpoint, dedup: DeliveryDedupCache,
+                token_provider: Optional[WizTokenProvider] = None, tenant_label: str = "",
+                archive: Optional[PageArchive] = None, projects: Optional["ProjectDirectory"] = None) -> Tuple[int, int, bool]:
+    """
+    Follows one cursor chain, merging the nodes of consecutive pages into batches
+    that are pushed onto the shared send queue (and copying them to the archive). Returns the issue count, the number
+    of unchanged issues skipped, and whether the chain was followed to its end.
+    """
+    label = tenant_label + ("" if shard_key == "all" else f"[{shard_key}] ")
     total_issues_count = 0
+    skipped_count = 0
     cursor = None
     has_next_page = True
     page_count = 0
 
-    print(f"Starting to fetch issues with page size of {PAGE_SIZE} and send to webhook...")
+    resume_point = checkpoint.load()
+    if resume_point:
+        cursor = resume_point.get("after")
+        page_count = resume_point.get("page_count", 0)
+        total_issues_count = resume_point.get("issues", 0)
+        if resume_point.get("completed"):
+            print(f"{label}Already delivered by the interrupted run ({total_issues_count} issues). Skipping.")
+            return total_issues_count, 0, True
+        print(f"{label}Resuming from checkpoint after page {page_count} ({total_issues_count} issues already delivered).")
 
+    page_sizer = PageSizeController(label=label)
     variables = initial_variables.copy()
-    variables["first"] = PAGE_SIZE 
+    batcher = WebhookBatcher()
+    # Cursor and running issue count of fetched pages not yet acknowledgeable
+    page_cursors: Dict[int, Tuple[Optional[str], int]] = {}
+    page_retrieved = page_changed = 0
+
+    def handle_nodes(nodes: List[Dict[str, Any]]):
+        nonlocal page_retrieved, page_changed
+        checkpoint.observe(nodes)
+        if projects is not None:
+            projects.observe(nodes)
+        if archive is not None:
+            archive.append(shard_key, page_count, nodes)
+        changed_nodes = dedup.filter_changed(nodes)
+        page_retrieved += len(nodes)
+        page_changed += len(changed_nodes)
+
+        # Hand full batches to the sender pool; blocks while the queue is full
+        for batch in batcher.add(changed_nodes, page_count):
+            METRICS.observe("wiz_sync_send_queue_depth", send_queue.qsize(), buckets=QUEUE_DEPTH_BUCKETS)
+            send_queue.put((checkpoint, checkpoint.batch_created(), batch))
+
+    streaming = STREAMING_DECODE and ijson is not None
+    if STREAMING_DECODE and not streaming:
+        print(f"{label}Warning: WIZ_STREAMING_DECODE is set but 'ijson' is not installed. Decoding whole responses.")
 
     while has_next_page:
         page_count += 1
         
         variables["after"] = cursor
+        variables["first"] = page_sizer.size
         
-        print(f"--- Fetching Page {page_count} (Cursor: {cursor or 'Start'}) ---")
+        print(f"--- {label}Fetching Page {page_count} (Cursor: {cursor or 'Start'}, Size: {page_sizer.size}) ---")
+
+        stats: Dict[str, Any] = {}
+        page_retrieved = page_changed = 0
+        if streaming:
+            response_data = query_wiz_api_streaming(query, variables, endpoint_url, lambda node: handle_nodes([node]), stats, token_provider)
+        else:
+            response_data = query_wiz_api(query, variables, endpoint_url, stats, token_provider)
 
-        response_data = query_wiz_api(query, variables, endpoint_url)
+        if stats.get("graphql_errors"):
+            if page_retrieved:
+                # Streamed nodes ahead of the errors are already batched and archived; fetching
+                # the same cursor again would hand them off twice, so the run stops here instead
+                print(f"{label}GraphQL errors after {page_retrieved} streamed issues. Not retrying the page.")
+            elif page_sizer.shrink_after_error():
+                # Retry the same cursor with a smaller page
+                METRICS.inc("wiz_sync_retries_total", stage="wiz_page_size")
+                page_count -= 1
+                continue
 
         if not response_data or not response_data.get('data'):
-            print("Received empty or malformed response data. Stopping pagination.")
+            print(f"{label}Received empty or malformed response data. Stopping pagination.")
+            # This page was never fetched
+            page_count -= 1
             break
         
         issues_data = response_data['data']['issues']
+        page_sizer.record_page(stats.get("latency", 0.0), stats.get("bytes", 0))
         
-        nodes = issues_data.get('nodes', [])
-        
-        # Pass webhook configuration to the send function
-        if nodes:
-            send_to_webhook(nodes, webhook_uid, external_kind)
+        handle_nodes(issues_data.get('nodes', []))
         
-        total_issues_count += len(nodes)
-        print(f"-> Retrieved {len(nodes)} issues on this page. Total issues processed: {total_issues_count}")
+        skipped_count += page_retrieved - page_changed
+        total_issues_count += page_retrieved
+        METRICS.inc("wiz_sync_pages_total")
+        METRICS.inc("wiz_sync_issues_fetched_total", page_retrieved)
+        METRICS.inc("wiz_sync_issues_skipped_total", page_retrieved - page_changed)
+        print(f"{label}-> Retrieved {page_retrieved} issues on this page ({page_retrieved - page_changed} unchanged). Total issues processed: {total_issues_count}")
 
         page_info = issues_data.get('pageInfo', {})
         has_next_page = page_info.get('hasNextPage', False)
         cursor = page_info.get('endCursor')
 
-        if not has_next_page:
-            break
+        # Only pages whose issues have all left the batcher can be acknowledged
+        if batcher.is_empty:
+            checkpoint.page_completed(page_count, cursor, total_issues_count)
+            page_cursors = {}
+        else:
+            page_cursors[page_count] = (cursor, total_issues_count)
+            complete_page = batcher.first_pending_page - 1
+            if complete_page in page_cursors:
+                checkpoint.page_completed(complete_page, *page_cursors[complete_page])
+            for page in [p for p in page_cursors if p <= complete_page]:
+                del page_cursors[page]
 
-    print("--- Pagination Complete ---")
-    print(f"Total issues retrieved and sent to webhook: {total_issues_count}")
-    return total_issues_count
+    for batch in batcher.flush():
+        send_queue.put((checkpoint, checkpoint.batch_created(), batch))
+    checkpoint.page_completed(page_count, cursor, total_issues_count)
+    return total_issues_count, skipped_count, not has_next_page
 
-def main():
+def fetch_all_issues(query: str, initial_variables: Dict[str, Any], endpoint_url: str, webhook_uid: str, external_kind: str, spool: WebhookSpool,
+                     token_provider: Optional[WizTokenProvider] = None, checkpoint_file: str = CHECKPOINT_FILE,
+                     dedup_cache_file: str = DEDUP_CACHE_FILE, label: str = "",
+                     archive: Optional[PageArchive] = None, dedup: Optional[DeliveryDedupCache] = None,
+                     projects: Optional["ProjectDirectory"] = None) -> Tuple[int, bool, Optional[str]]:
     """
-    Main function to execute the API call, handle pagination, and send to webhook.
+    Fetches issues from the Wiz API using cursor-based pagination and sends each page 
+    of results to the configured webhook.
+
+    Fetching and sending are pipelined: each cursor chain merges the nodes of
+    consecutive pages into size-bounded batches, which are pushed onto a bounded
+    queue while a pool of sender threads posts them to OpsLevel. The bounded queue
+    applies back-pressure when OpsLevel is slower than Wiz. Batches that cannot be
+    delivered are written to the spool.
+
+    With WIZ_SHARD_BY set, the query is split into shards (see build_shards) that
+    follow their own cursor chains concurrently, up to WIZ_SHARD_CONCURRENCY at a
+    time, and feed the same send queue.
+
+    Issues already delivered with identical content (see DeliveryDedupCache) are
+    not sent again. Progress is checkpointed per shard after each acknowledged page,
+    and an interrupted run with the same filter set resumes from the stored cursor.
+    Returns the total issue count, whether every cursor chain was followed to its
+    end, and the highest `statusChangedAt` among the fetched issues.
     """
-    print("Starting Wiz API script.")
-    
-    # IMPROVEMENT 1: Validate all required environment variables upfront
-    client_id = os.getenv("WIZ_CLIENT_ID")
-    client_secret = os.getenv("WIZ_CLIENT_SECRET")
-    endpoint_url = os.getenv("WIZ_ENDPOINT_URL")
-    token_url = os.getenv("WIZ_TOKEN_URL")
-    webhook_uid = os.getenv("OPSLEVEL_WEBHOOK_UID")
-    external_kind = os.getenv("OPSLEVEL_EXTERNAL_KIND") # Default is handled globally, but good to check
-
-    required_vars = {
-        "WIZ_CLIENT_ID": client_id,
-        "WIZ_CLIENT_SECRET": client_secret,
-        "WIZ_ENDPOINT_URL": endpoint_url,
-        "WIZ_TOKEN_URL": token_url,
-        "OPSLEVEL_WEBHOOK_UID": webhook_uid
-    }
+    shards = build_shards(initial_variables)
+    store = CheckpointStore(get_config_path(checkpoint_file))
+    if dedup is None:
+        dedup = DeliveryDedupCache(get_config_path(dedup_cache_file))
+    else:
+        # Only the previous cycle's polled leftovers; the push receiver may still be sending its batches
+        dedup.discard_pending("poll")
+
+    print(f"{label}Starting to fetch issues in {len(shards)} shard(s) with "
+          f"{'adaptive ' if ADAPTIVE_PAGE_SIZE else ''}page size of {PAGE_SIZE} "
+          f"and send to webhook using {WEBHOOK_SENDER_THREADS} sender thread(s)...")
+
+    send_queue: "queue.Queue[Optional[Tuple[PaginationCheckpoint, int, List[Dict[str, Any]]]]]" = queue.Queue(maxsize=SEND_QUEUE_MAX_BATCHES)
+    senders = [
+        threading.Thread(
+            target=webhook_sender,
+            args=(send_queue, webhook_uid, external_kind, spool, dedup),
+            name=f"webhook-sender-{i + 1}",
+            daemon=True,
+        )
+        for i in range(WEBHOOK_SENDER_THREADS)
+    ]
+    for sender in senders:
+        sender.start()
+
+    checkpoints = {key: PaginationCheckpoint(store, key, variables) for key, variables in shards}
+
+    def run_shard(shard: Tuple[str, Dict[str, Any]]) -> Tuple[int, int, bool]:
+        key, variables = shard
+        try:
+            return fetch_shard(key, query, variables, endpoint_url, send_queue, checkpoints[key], dedup, token_provider, label, archive, projects)
+        except Exception as e:
+            print(f"{label}Wiz-API-Error: Shard '{key}' failed - {e}")
+            return 0, 0, False
 
-    missing_vars = [name for name, value in required_vars.items() if not value]
-    if missing_vars:
-        print(f"\n🛑 FATAL ERROR: The following required environment variables are missing: {', '.join(missing_vars)}")
-        sys.exit(1)
-        
-    # 1. Authentication
     try:
-        request_wiz_api_token(client_id, client_secret, token_url)
-        print("Wiz token retrieved successfully.")
+        with ThreadPoolExecutor(max_workers=min(SHARD_CONCURRENCY, len(shards)), thread_name_prefix="wiz-shard") as pool:
+            results = dict(zip([key for key, _ in shards], pool.map(run_shard, shards)))
+    finally:
+        # One sentinel per sender, then wait for in-flight batches to be delivered
+        for _ in senders:
+            send_queue.put(None)
+        for sender in senders:
+            sender.join()
+        dedup.save()
+
+    total_issues_count = sum(issues for issues, _, _ in results.values())
+    skipped_count = sum(skipped for _, skipped, _ in results.values())
+    # A shard is only complete once every batch it created was delivered or spooled;
+    # a batch lost to an unexpected error (e.g. a full spool disk) keeps the checkpoint and watermark
+    unacknowledged = {key: checkpoint.unacknowledged() for key, checkpoint in checkpoints.items()}
+    completed = {key: shard_completed and not unacknowledged[key] for key, (_, _, shard_completed) in results.items()}
+    if not all(completed.values()):
+        for key, shard_completed in completed.items():
+            if shard_completed:
+                checkpoints[key].mark_completed()
+        if any(unacknowledged.values()):
+            print(f"{label}Webhook-Error: {sum(unacknowledged.values())} batch(es) were neither delivered nor spooled.")
+        print(f"--- {label}Pagination Interrupted ---")
+        print(f"{label}Checkpoint kept at '{store.file_path}'. The next run resumes from the last acknowledged page.")
+        return total_issues_count, False, None
+
+    store.clear()
+    max_status_changed_at = max(
+        (c.max_status_changed_at for c in checkpoints.values() if c.max_status_changed_at),
+        key=parse_wiz_timestamp,
+        default=None,
+    )
+    print(f"--- {label}Pagination Complete ---")
+    print(f"{label}Total issues retrieved: {total_issues_count} ({skipped_count} unchanged and not re-sent this run)")
+    return total_issues_count, True, max_status_changed_at
+
+def drain_spool(spool: WebhookSpool, config_file: str = CONFIG_FILE, label: str = "") -> bool:
+    """
+    Replays the spool and, once it is empty, promotes any pending watermark.
+    Returns True when the spool is empty.
+    """
+    if not spool.replay():
+        return False
+
+    pending = load_config(config_file).get('pending_status_changed_after')
+    if pending:
+        update_config(config_file, pending, label)
+    return True
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sync Wiz issues to an OpsLevel custom webhook.")
+    parser.add_argument(
+        "--drain-spool",
+        action="store_true",
+        help="Only replay undelivered batches from the spool, then exit.",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="Re-send the issues in the page archive (WIZ_ARCHIVE_DIR) to OpsLevel without querying Wiz, then exit.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and start a sync cycle every --interval seconds.",
+    )
+    parser.add_argument(
+        "--receive",
+        action="store_true",
+        help="Accept Wiz automation pushes on WIZ_RECEIVER_HOST:WIZ_RECEIVER_PORT and forward them to OpsLevel; "
+             "polling continues as a reconcile every --interval seconds.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=None,
+        help=f"Seconds between the starts of daemon sync cycles (default {DAEMON_INTERVAL_SECONDS:g}, "
+             f"or {RECONCILE_INTERVAL_SECONDS:g} with --receive).",
+    )
+    return parser.parse_args()
+
+class SyncLock:
+    """
+    Exclusive, non-blocking lock on a file, held while a sync or the daemon runs so
+    that overlapping runs (e.g. a slow cron run and the next one) cannot interleave.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._file = None
+
+    def acquire(self) -> bool:
+        """Takes the lock; returns False if another process holds it."""
+        if fcntl is None:
+            print("Warning: File locking is not supported on this platform. Overlapping runs are not prevented.")
+            return True
+        self._file = open(self.file_path, "a+")
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(f"{os.getpid()}\n")
+        self._file.flush()
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+def read_settings(entry: Optional[Dict[str, Any]] = None) -> Dict[str, Optional[str]]:
+    """
+    Resolves a tenant's settings (see SETTING_ENV_VARS). In a tenant entry from the
+    config file each setting can be given directly, or as `<setting>_env` naming the
+    environment variable that holds it (recommended for `client_secret`); missing
+    settings fall back to the global environment variable.
+    """
+    entry = entry or {}
+    settings = {}
+    for key, env_name in SETTING_ENV_VARS.items():
+        if entry.get(key):
+            settings[key] = entry[key]
+        elif entry.get(f"{key}_env"):
+            settings[key] = os.getenv(entry[f"{key}_env"])
+        else:
+            settings[key] = os.getenv(env_name)
+    settings["external_kind"] = settings["external_kind"] or EXTERNAL_KIND
+    return settings
+
+def missing_settings(settings: Dict[str, Optional[str]], required: Tuple[str, ...] = SYNC_SETTINGS) -> List[str]:
+    """Names of the required settings that are unset, with the environment variable each defaults to."""
+    return [f"{SETTING_ENV_VARS[key]} ({key})" for key in required if not settings.get(key)]
+
+class Tenant:
+    """
+    One Wiz tenant and OpsLevel webhook target. Each tenant has its own watermark,
+    checkpoint, dedup cache, spool and token cache: in the tenant's state directory
+    when configured in the config file's "tenants" list, otherwise the files
+    configured for the script.
+    """
+
+    def __init__(self, name: str, settings: Dict[str, Optional[str]], state_dir: Optional[str] = None):
+        self.name = name
+        self.settings = settings
+        if state_dir:
+            self.label = f"[{name}] "
+            self.config_file = os.path.join(state_dir, "watermark.json")
+            self.checkpoint_file = os.path.join(state_dir, "checkpoint.json")
+            self.dedup_cache_file = os.path.join(state_dir, "dedup_cache.json")
+            spool_dir = os.path.join(state_dir, "spool")
+            token_cache_file = os.path.join(state_dir, "token_cache.json")
+            archive_dir = os.path.join(get_config_path(ARCHIVE_DIR), name) if ARCHIVE_DIR else None
+        else:
+            self.label = ""
+            self.config_file = get_config_path(CONFIG_FILE)
+            self.checkpoint_file = get_config_path(CHECKPOINT_FILE)
+            self.dedup_cache_file = get_config_path(DEDUP_CACHE_FILE)
+            spool_dir = get_config_path(SPOOL_DIR)
+            token_cache_file = get_config_path(TOKEN_CACHE_FILE)
+            archive_dir = get_config_path(ARCHIVE_DIR) if ARCHIVE_DIR else None
+        self.spool = WebhookSpool(spool_dir)
+        self.archive = PageArchive(archive_dir) if archive_dir else None
+        # Kept in memory across daemon cycles and shared with the push receiver
+        self.dedup = DeliveryDedupCache(self.dedup_cache_file)
+        # Projects seen while polling, used to complete pushed issues
+        self.projects = ProjectDirectory()
+        self.token_provider = WizTokenProvider(settings["client_id"], settings["client_secret"], settings["token_url"], token_cache_file)
+
+def load_tenants(file_name: str, required: Tuple[str, ...] = SYNC_SETTINGS) -> Optional[List[Tenant]]:
+    """
+    Builds the sync targets. With a "tenants" list in the config file there is one
+    Tenant per entry; otherwise a single tenant is configured from the environment.
+    A tenant's optional `status_changed_after` seeds its watermark on its first run.
+    Returns None (after printing why) if a `required` setting is missing.
+    """
+    file_path = get_config_path(file_name)
+    entries = None
+    if os.path.exists(file_path):
+        try:
+            with open(file_path, 'r') as f:
+                raw_config = json.load(f)
+            entries = raw_config.get("tenants") if isinstance(raw_config, dict) else None
+        except (json.JSONDecodeError, IOError):
+            pass # Reported by load_config
+
+    if not entries:
+        settings = read_settings()
+        missing = missing_settings(settings, required)
+        if missing:
+            print(f"\n🛑 FATAL ERROR: The following required environment variables are missing: {', '.join(missing)}")
+            return None
+        return [Tenant("default", settings)]
+
+    tenants = []
+    state_root = get_config_path(TENANT_STATE_DIR)
+    for entry in entries:
+        name = str(entry.get("name") or "") if isinstance(entry, dict) else ""
+        if not TENANT_NAME_PATTERN.fullmatch(name) or name in [t.name for t in tenants]:
+            print(f"\n🛑 FATAL ERROR: Every tenant in '{file_path}' needs a unique 'name' (letters, digits, '_', '.', '-'). Got: {name or entry!r}")
+            return None
+        settings = read_settings(entry)
+        missing = missing_settings(settings, required)
+        if missing:
+            print(f"\n🛑 FATAL ERROR: Tenant '{name}' is missing required settings: {', '.join(missing)}")
+            return None
+
+        state_dir = os.path.join(state_root, name)
+        os.makedirs(state_dir, exist_ok=True)
+        tenant = Tenant(name, settings, state_dir)
+        if entry.get("status_changed_after") and not os.path.exists(tenant.config_file):
+            write_config_keys(tenant.config_file, {"status_changed_after": entry["status_changed_after"]})
+        tenants.append(tenant)
+    return tenants
+
+def size_connection_pools(concurrent_tenants: int):
+    """Grows the shared connection pools so that concurrent tenants reuse connections instead of discarding them."""
+    WIZ_SESSION.mount("https://", HTTPAdapter(pool_maxsize=SHARD_CONCURRENCY * concurrent_tenants))
+    WEBHOOK_SESSION.mount("https://", HTTPAdapter(pool_maxsize=WEBHOOK_SENDER_THREADS * concurrent_tenants))
+
+def run_sync(tenant: Tenant) -> int:
+    """
+    Executes one sync of a tenant: authenticate, fetch all pages and send them to the
+    webhook, then advance the tenant's watermark. Returns the process exit code.
+    """
+    label = tenant.label
+    print(f"{label}Starting Wiz API script.")
+    endpoint_url = tenant.settings["endpoint_url"]
+    webhook_uid = tenant.settings["webhook_uid"]
+    external_kind = tenant.settings["external_kind"]
+    spool = tenant.spool
+
+    # 1. Authentication (reuses the cached token while it is valid)
+    try:
+        tenant.token_provider.get_token()
+        print(f"{label}Wiz token retrieved successfully.")
     except Exception as e:
-        print(f"Authentication failed: {e}")
-        sys.exit(1)
+        print(f"{label}Authentication failed: {e}")
+        return 1
+
+    # 2. Deliver batches left over from earlier runs, then load Configuration for Filters
+    drain_spool(spool, tenant.config_file, label)
 
-    # 2. Load Configuration for Filters
-    config = load_config(CONFIG_FILE)
+    config = load_config(tenant.config_file)
     if not config:
-        sys.exit(1)
+        return 1
 
     status_changed_after = config['status_changed_after']
-    print(f"Filter configured to retrieve issues changed after: {status_changed_after}")
+    print(f"{label}Filter configured to retrieve issues changed after: {status_changed_after}")
     
     # 3. Define Query and Initial Variables
     query = get_issues_query()
@@ -369,25 +2023,583 @@ def main():
     }
 
     # 4. Fetch All Issues with Pagination (and sending to webhook)
-    total_issues_count = fetch_all_issues(
+    total_issues_count, completed, max_status_changed_at = fetch_all_issues(
         query, 
         base_variables, 
         endpoint_url, 
         webhook_uid, 
-        external_kind
+        external_kind,
+        spool,
+        tenant.token_provider,
+        tenant.checkpoint_file,
+        tenant.dedup_cache_file,
+        label,
+        tenant.archive,
+        tenant.dedup,
+        tenant.projects
     )
     
     # 5. Process Results
+    if not completed:
+        # Keep the watermark so the interrupted window is fetched again
+        print(f"\n{label}Sync did not complete. Configuration file was not updated.")
+        return 1
+
     if total_issues_count > 0:
-        print(f"\n--- Script Finished ---")
-        print(f"Successfully processed and sent {total_issues_count} issues to the OpsLevel webhook.")
+        print(f"\n--- {label}Script Finished ---")
+        print(f"{label}Successfully processed and sent {total_issues_count} issues to the OpsLevel webhook.")
         
-        # SUCCESS: Update config file to current time
-        update_config(CONFIG_FILE) 
+        # SUCCESS: Advance the watermark to the newest change seen (minus the overlap),
+        # unless batches are still spooled
+        new_watermark = next_watermark(status_changed_after, max_status_changed_at)
+        print(f"{label}Newest statusChangedAt fetched: {max_status_changed_at} (overlap {WATERMARK_OVERLAP_SECONDS:g}s).")
+        if spool.is_empty():
+            update_config(tenant.config_file, new_watermark, label) 
+        else:
+            set_pending_watermark(tenant.config_file, new_watermark, label)
         
     else:
-        print("\nSuccessfully executed but no new issues were retrieved or processed.")
-        sys.exit(0)
+        print(f"\n{label}Successfully executed but no new issues were retrieved or processed.")
+    return 0
+
+def run_tenants(tenants: List[Tenant]) -> int:
+    """
+    Syncs every tenant, up to WIZ_TENANT_CONCURRENCY at a time, sharing the HTTP
+    connection pools. Returns 0 only if every tenant's sync succeeded.
+    """
+    def run_tenant(tenant: Tenant) -> int:
+        try:
+            exit_code = run_sync(tenant)
+        except Exception as e:
+            print(f"{tenant.label}Sync failed with an unexpected error: {e}")
+            exit_code = 1
+        METRICS.set_gauge("wiz_sync_tenant_last_run_success", 1 if exit_code == 0 else 0, tenant=tenant.name)
+        return exit_code
+
+    if len(tenants) == 1:
+        return run_tenant(tenants[0])
+
+    with ThreadPoolExecutor(max_workers=min(TENANT_CONCURRENCY, len(tenants)), thread_name_prefix="wiz-tenant") as pool:
+        exit_codes = dict(zip([t.name for t in tenants], pool.map(run_tenant, tenants)))
+    failed = [name for name, exit_code in exit_codes.items() if exit_code != 0]
+    if failed:
+        print(f"\nSync failed for {len(failed)} of {len(tenants)} tenant(s): {', '.join(failed)}")
+        return 1
+    print(f"\nAll {len(tenants)} tenants synced successfully.")
+    return 0
+
+def replay_archive(tenant: Tenant) -> int:
+    """
+    Re-sends the tenant's archived issues to its webhook without querying Wiz. Only
+    the most recently archived version of each issue is sent. Batches OpsLevel does
+    not accept are spooled. Returns 0 when every batch was delivered.
+    """
+    label = tenant.label
+    if tenant.archive is None or not tenant.archive.segment_files():
+        print(f"{label}Replay: No archive found. Set WIZ_ARCHIVE_DIR to the archive written by earlier syncs.")
+        return 1
+
+    segments = tenant.archive.segment_files()
+    print(f"{label}Replay: Reading {len(segments)} archive segment(s) from '{tenant.archive.directory}'...")
+    latest: Dict[str, Dict[str, Any]] = {}
+    archived = 0
+    for node in tenant.archive.iter_nodes():
+        archived += 1
+        # Re-insert so the dict keeps the order of each issue's latest version
+        latest.pop(node.get("id"), None)
+        latest[node.get("id")] = node
+    print(f"{label}Replay: {archived} archived issue versions, {len(latest)} distinct issues.")
+
+    batcher = WebhookBatcher()
+    batches = batcher.add(list(latest.values())) + batcher.flush()
+    webhook_uid = tenant.settings["webhook_uid"]
+    external_kind = tenant.settings["external_kind"]
+
+    def send(batch: List[Dict[str, Any]]) -> bool:
+        if send_to_webhook(batch, webhook_uid, external_kind):
+            return True
+        tenant.spool.append(batch, webhook_uid, external_kind)
+        return False
+
+    with ThreadPoolExecutor(max_workers=WEBHOOK_SENDER_THREADS, thread_name_prefix="replay-sender") as pool:
+        results = list(pool.map(send, batches))
+    failed = results.count(False)
+    print(f"{label}Replay: Sent {len(results) - failed} of {len(batches)} batch(es) ({len(latest)} issues); {failed} spooled.")
+    return 0 if failed == 0 else 1
+
+def drain_tenant_spools(tenants: List[Tenant]) -> int:
+    """Replays every tenant's spool. Returns 0 when all spools are empty afterwards."""
+    drained = [drain_spool(t.spool, t.config_file, t.label) for t in tenants]
+    return 0 if all(drained) else 1
+
+ENTITY_SNAPSHOT_FIELDS = ("id", "type", "nativeType", "name", "status", "cloudPlatform", "cloudProviderURL", "providerId", "tags", "externalId")
+PROJECT_FIELDS = ("id", "name", "slug", "businessUnit")
+# Fields get_issues_query selects per source rule type, with the push keys they are read from
+SOURCE_RULE_FIELDS: Dict[str, Tuple[Tuple[str, Tuple[str, ...]], ...]] = {
+    "Control": (
+        ("id", ("id",)),
+        ("name", ("name",)),
+        ("controlDescription", ("controlDescription", "description")),
+        ("resolutionRecommendation", ("resolutionRecommendation",)),
+    ),
+    "CloudEventRule": (
+        ("id", ("id",)),
+        ("name", ("name",)),
+        ("cloudEventRuleDescription", ("cloudEventRuleDescription", "description")),
+        ("sourceType", ("sourceType",)),
+        ("type", ("type",)),
+    ),
+    "CloudConfigurationRule": (
+        ("id", ("id",)),
+        ("name", ("name",)),
+        ("cloudConfigurationRuleDescription", ("cloudConfigurationRuleDescription", "description")),
+        ("remediationInstructions", ("remediationInstructions", "resolutionRecommendation")),
+        ("serviceType", ("serviceType",)),
+    ),
+}
+
+class ProjectDirectory:
+    """
+    Wiz projects seen in polled issues, by id and by name. Pushes that carry only
+    project names (or partial project objects) are completed from it, so a pushed
+    issue matches its polled form.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+
+    def observe(self, nodes: List[Dict[str, Any]]):
+        with self._lock:
+            for node in nodes:
+                for project in node.get("projects") or []:
+                    if isinstance(project, dict) and project.get("id"):
+                        self._by_id[project["id"]] = project
+                        if project.get("name"):
+                            self._by_name[project["name"]] = project
+
+    def lookup(self, project_id: Optional[str], name: Optional[str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._by_id.get(project_id) or self._by_name.get(name)
+
+def _push_projects(projects: Any, directory: Optional[ProjectDirectory] = None) -> List[Dict[str, Any]]:
+    """
+    Projects a pushed `projects` value (a list of objects, or a comma-separated list
+    of names) into the query's shape. Missing fields are filled in from `directory`;
+    fields that cannot be resolved are left out rather than set to null.
+    """
+    if isinstance(projects, str):
+        projects = [{"name": name.strip()} for name in projects.split(",") if name.strip()]
+
+    result = []
+    for project in projects or []:
+        if not isinstance(project, dict):
+            continue
+        known = directory.lookup(project.get("id"), project.get("name")) if directory else None
+        merged = {**(known or {}), **{field: project[field] for field in PROJECT_FIELDS if field in project}}
+        result.append({field: merged[field] for field in PROJECT_FIELDS if field in merged})
+    return result
+
+def _push_source_rule(rule: Dict[str, Any]) -> Dict[str, Any]:
+    """Projects a pushed rule into the fields get_issues_query selects for its `__typename` (default Control)."""
+    typename = rule.get("__typename") or "Control"
+    fields = SOURCE_RULE_FIELDS.get(typename)
+    if fields is None:
+        return dict(rule)
+    projected: Dict[str, Any] = {"__typename": typename}
+    for field, sources in fields:
+        projected[field] = next((rule[source] for source in sources if source in rule), None)
+    return projected
+
+def project_push_item(item: Dict[str, Any], directory: Optional[ProjectDirectory] = None) -> Optional[Dict[str, Any]]:
+    """
+    Projects one pushed issue into the node shape returned by get_issues_query, so
+    pushed and polled issues share the OpsLevel mapping, batching and dedup hash.
+
+    Accepts the Wiz automation webhook format ({"trigger", "issue", "resource",
+    "control"}) and items that already have the node shape. The rule keeps the
+    `__typename` it was pushed with. Returns None for items without an issue `id`.
+    """
+    issue = item.get("issue")
+    if not isinstance(issue, dict):
+        # Already node-shaped, e.g. a custom template mirroring the GraphQL query
+        return item if item.get("id") else None
+    if not issue.get("id"):
+        return None
+
+    resource = item.get("resource") or issue.get("entitySnapshot") or {}
+    tags = resource.get("tags")
+    if isinstance(tags, list):
+        tags = {t.get("key"): t.get("value") for t in tags if isinstance(t, dict)}
+    entity = {field: resource.get(field) for field in ENTITY_SNAPSHOT_FIELDS} if resource else None
+    if entity is not None:
+        entity["tags"] = tags
+
+    rules = issue.get("sourceRules")
+    if not rules:
+        rule = item.get("control") or item.get("sourceRule")
+        rules = [rule] if isinstance(rule, dict) and rule.get("id") else []
+
+    return {
+        "id": issue["id"],
+        "sourceRules": [_push_source_rule(rule) for rule in rules if isinstance(rule, dict)],
+        "createdAt": issue.get("createdAt") or issue.get("created"),
+        "updatedAt": issue.get("updatedAt") or issue.get("updated"),
+        "dueAt": issue.get("dueAt"),
+        "type": issue.get("type"),
+        "resolvedAt": issue.get("resolvedAt"),
+        "statusChangedAt": issue.get("statusChangedAt"),
+        "projects": _push_projects(issue.get("projects"), directory),
+        "status": issue.get("status"),
+        "severity": issue.get("severity"),
+        "entitySnapshot": entity,
+        "serviceTickets": issue.get("serviceTickets") or [],
+    }
+
+def project_push_payload(payload: Any, directory: Optional[ProjectDirectory] = None) -> List[Dict[str, Any]]:
+    """Projects a push body holding one item, a list of items, or {"issues": [...]} into issue nodes."""
+    if isinstance(payload, dict) and isinstance(payload.get("issues"), list):
+        payload = payload["issues"]
+    items = payload if isinstance(payload, list) else [payload]
+    nodes = [project_push_item(item, directory) for item in items if isinstance(item, dict)]
+    return [node for node in nodes if node is not None]
+
+class PushPipeline:
+    """
+    Batches pushed issues of one tenant and delivers them through the same sender
+    stage as polling: unchanged issues are skipped by the tenant's dedup cache, the
+    rest are merged into size-bounded batches, and partial batches are flushed every
+    WIZ_RECEIVER_FLUSH_SECONDS. Undeliverable batches go to the tenant's spool.
+    """
+
+    def __init__(self, tenant: Tenant, flush_seconds: float = RECEIVER_FLUSH_SECONDS):
+        self.tenant = tenant
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._batcher = WebhookBatcher()
+        self._stop = threading.Event()
+        self._send_queue: "queue.Queue[Optional[Tuple[Optional[PaginationCheckpoint], int, List[Dict[str, Any]]]]]" = queue.Queue(maxsize=SEND_QUEUE_MAX_BATCHES)
+        self._threads = [
+            threading.Thread(
+                target=webhook_sender,
+                args=(self._send_queue, tenant.settings["webhook_uid"], tenant.settings["external_kind"], tenant.spool, tenant.dedup),
+                name=f"push-sender-{tenant.name}-{i + 1}",
+                daemon=True,
+            )
+            for i in range(WEBHOOK_SENDER_THREADS)
+        ]
+        self._flusher = threading.Thread(target=self._flush_periodically, name=f"push-flusher-{tenant.name}", daemon=True)
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        self._flusher.start()
+
+    def add(self, nodes: List[Dict[str, Any]]) -> int:
+        """Queues pushed issue nodes for delivery; returns how many were new or changed."""
+        with self._lock:
+            changed = self.tenant.dedup.filter_changed(nodes, source="push")
+            batches = self._batcher.add(changed)
+        # Blocks while the send queue is full, pushing back on the sender of the push
+        for batch in batches:
+            self._send_queue.put((None, 0, batch))
+        return len(changed)
+
+    def flush(self):
+        with self._lock:
+            batches = self._batcher.flush()
+        for batch in batches:
+            self._send_queue.put((None, 0, batch))
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+    def stop(self):
+        """Flushes the pending issues and waits for the senders to deliver them."""
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+        for _ in self._threads:
+            self._send_queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.tenant.dedup.save()
+
+def gunzip_capped(data: bytes, limit: int) -> Optional[bytes]:
+    """
+    Decompresses a gzip body without ever inflating more than `limit` + 1 bytes.
+    Returns None when the decompressed body would exceed `limit`.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    body = decompressor.decompress(data, limit + 1)
+    if len(body) > limit or decompressor.unconsumed_tail:
+        return None
+    if not decompressor.eof:
+        raise ValueError("Truncated gzip body")
+    return body
+
+def start_push_receiver(pipelines: Dict[str, PushPipeline], host: str = RECEIVER_HOST, port: int = RECEIVER_PORT,
+                        token: Optional[str] = RECEIVER_TOKEN) -> ThreadingHTTPServer:
+    """
+    Serves POST /issues (single tenant) and POST /issues/<tenant name> on a background
+    thread. Requests must carry `Authorization: Bearer <WIZ_RECEIVER_TOKEN>` when a
+    token is configured. Pushed issues are accepted with 202 once queued for delivery.
+    """
+    single = next(iter(pipelines.values())) if len(pipelines) == 1 and "default" in pipelines else None
+
+    class PushHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: Dict[str, Any]):
+            METRICS.inc("wiz_sync_push_requests_total", status=str(status))
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            path = self.path.split("?", 1)[0].rstrip("/")
+            if path == "/issues" and single is not None:
+                pipeline = single
+            elif path.startswith("/issues/") and path[len("/issues/"):] in pipelines:
+                pipeline = pipelines[path[len("/issues/"):]]
+            else:
+                self._reply(404, {"error": "Unknown path"})
+                return
+
+            if token and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}"):
+                self._reply(401, {"error": "Unauthorized"})
+                return
+
+            # Only a plain non-negative integer; anything else could make read() wait for EOF
+            content_length = (self.headers.get("Content-Length") or "0").strip()
+            if not (content_length.isascii() and content_length.isdigit()):
+                self._reply(400, {"error": "Invalid Content-Length"})
+                return
+            length = int(content_length)
+            if length > RECEIVER_MAX_BYTES:
+                self._reply(413, {"error": f"Body exceeds {RECEIVER_MAX_BYTES} bytes"})
+                return
+            body = self.rfile.read(length)
+            try:
+                if self.headers.get("Content-Encoding", "") == "gzip":
+                    body = gunzip_capped(body, RECEIVER_MAX_BYTES)
+                    if body is None:
+                        self._reply(413, {"error": f"Decompressed body exceeds {RECEIVER_MAX_BYTES} bytes"})
+                        return
+                nodes = project_push_payload(json.loads(body), pipeline.tenant.projects)
+            except (OSError, ValueError, zlib.error) as e:
+                self._reply(400, {"error": f"Malformed body: {e}"})
+                return
+
+            changed = pipeline.add(nodes)
+            METRICS.inc("wiz_sync_push_issues_total", len(nodes))
+            self._reply(202, {"accepted": len(nodes), "changed": changed})
+
+    server = ThreadingHTTPServer((host, port), PushHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="push-receiver", daemon=True).start()
+    return server
+
+def run_timed(run: Callable[[], int]) -> int:
+    """Runs one sync (or spool drain), then records and exports the run metrics."""
+    started = time.monotonic()
+    exit_code = 1
+    try:
+        exit_code = run()
+    finally:
+        METRICS.inc("wiz_sync_runs_total", outcome="success" if exit_code == 0 else "failure")
+        METRICS.set_gauge("wiz_sync_run_duration_seconds", round(time.monotonic() - started, 3))
+        METRICS.set_gauge("wiz_sync_last_run_success", 1 if exit_code == 0 else 0)
+        METRICS.set_gauge("wiz_sync_last_run_timestamp_seconds", round(time.time()))
+        METRICS.write()
+    return exit_code
+
+class DaemonHealth:
+    """Outcome of the daemon's sync cycles, reported by /healthz."""
+
+    def __init__(self, interval: float, max_failures: int = HEALTH_MAX_FAILURES):
+        self.interval = interval
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+        self.started_at = utc_now_iso()
+        self.cycles = 0
+        self.consecutive_failures = 0
+        self.last_cycle_at: Optional[str] = None
+        self.last_success_at: Optional[str] = None
+
+    def record_cycle(self, success: bool):
+        with self._lock:
+            self.cycles += 1
+            self.last_cycle_at = utc_now_iso()
+            if success:
+                self.consecutive_failures = 0
+                self.last_success_at = self.last_cycle_at
+            else:
+                self.consecutive_failures += 1
+
+    def snapshot(self) -> Tuple[bool, Dict[str, Any]]:
+        """Returns whether the daemon is healthy, and the status document."""
+        with self._lock:
+            healthy = self.consecutive_failures < self.max_failures
+            return healthy, {
+                "status": "ok" if healthy else "failing",
+                "started_at": self.started_at,
+                "interval_seconds": self.interval,
+                "cycles": self.cycles,
+                "consecutive_failures": self.consecutive_failures,
+                "last_cycle_at": self.last_cycle_at,
+                "last_success_at": self.last_success_at,
+            }
+
+def start_health_server(health: DaemonHealth, host: str = HEALTH_HOST, port: int = HEALTH_PORT) -> ThreadingHTTPServer:
+    """Serves GET /healthz (JSON status, 503 when failing) and GET /metrics (Prometheus text) on a background thread."""
+    class HealthHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: bytes, content_type: str):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                healthy, status = health.snapshot()
+                self._reply(200 if healthy else 503, json.dumps(status).encode("utf-8"), "application/json")
+            elif self.path == "/metrics":
+                self._reply(200, METRICS.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+            else:
+                self._reply(404, b"Not Found\n", "text/plain")
+
+    server = ThreadingHTTPServer((host, port), HealthHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="health-server", daemon=True).start()
+    return server
+
+def run_daemon(tenants: List[Tenant], interval: float) -> int:
+    """
+    Runs a sync cycle of all tenants every `interval` seconds (start to start; a
+    cycle that overruns is followed immediately by the next) until SIGTERM or SIGINT.
+    The HTTP sessions and the Wiz tokens are reused across cycles.
+    """
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"Daemon: Received signal {signum}. Stopping after the current cycle.")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    health = DaemonHealth(interval)
+    server = None
+    if HEALTH_PORT:
+        try:
+            server = start_health_server(health)
+            print(f"Daemon: Health and metrics endpoint on http://{HEALTH_HOST}:{server.server_address[1]}/healthz and /metrics")
+        except OSError as e:
+            print(f"Daemon: Warning: Could not start the health endpoint on {HEALTH_HOST}:{HEALTH_PORT}: {e}")
+
+    print(f"Daemon: Starting sync cycles every {interval:g}s.")
+    try:
+        while not stop.is_set():
+            cycle_started = time.monotonic()
+            try:
+                exit_code = run_timed(lambda: run_tenants(tenants))
+            except Exception as e:
+                print(f"Daemon: Sync cycle failed with an unexpected error: {e}")
+                exit_code = 1
+            health.record_cycle(exit_code == 0)
+            remaining = interval - (time.monotonic() - cycle_started)
+            if remaining > 0:
+                print(f"Daemon: Next cycle in {remaining:.0f}s.")
+            stop.wait(max(0.0, remaining))
+    finally:
+        if server is not None:
+            server.shutdown()
+    print("Daemon: Stopped.")
+    return 0
+
+def run_receiver(tenants: List[Tenant], reconcile_interval: float) -> int:
+    """
+    Runs the push receiver for all tenants, with polling as a periodic reconcile
+    (the daemon loop) that also advances the watermarks. Stops on SIGTERM or SIGINT
+    after delivering the issues already received.
+    """
+    if not RECEIVER_TOKEN and RECEIVER_HOST not in ("127.0.0.1", "localhost", "::1"):
+        print(f"\n🛑 FATAL ERROR: WIZ_RECEIVER_TOKEN is required when the receiver listens on '{RECEIVER_HOST}'.")
+        return 1
+
+    pipelines = {tenant.name: PushPipeline(tenant) for tenant in tenants}
+    for pipeline in pipelines.values():
+        pipeline.start()
+    try:
+        server = start_push_receiver(pipelines)
+    except OSError as e:
+        print(f"\n🛑 FATAL ERROR: Could not start the push receiver on {RECEIVER_HOST}:{RECEIVER_PORT}: {e}")
+        return 1
+    paths = ["/issues"] if "default" in pipelines and len(pipelines) == 1 else [f"/issues/{name}" for name in pipelines]
+    print(f"Receiver: Accepting Wiz pushes on http://{RECEIVER_HOST}:{server.server_address[1]} ({', '.join(paths)})")
+
+    try:
+        return run_daemon(tenants, reconcile_interval)
+    finally:
+        server.shutdown()
+        for pipeline in pipelines.values():
+            pipeline.stop()
+        print("Receiver: Stopped.")
+
+def main():
+    """
+    Main function to execute the API call, handle pagination, and send to webhook.
+    """
+    args = parse_args()
+
+    tenants = None
+    lock = SyncLock(get_config_path(LOCK_FILE))
+    if not lock.acquire():
+        print(f"Another sync holds the lock '{lock.file_path}'. Skipping this run.")
+        sys.exit(1 if args.daemon or args.receive else 0)
+
+    try:
+        if args.drain_spool:
+            required = ()
+        elif args.replay:
+            required = WEBHOOK_SETTINGS
+        else:
+            required = SYNC_SETTINGS
+        tenants = load_tenants(CONFIG_FILE, required)
+        if tenants is None:
+            exit_code = run_timed(lambda: 1)
+        elif args.drain_spool:
+            print("Draining webhook spool.")
+            exit_code = run_timed(lambda: drain_tenant_spools(tenants))
+        elif args.replay:
+            exit_code = run_timed(lambda: max(replay_archive(t) for t in tenants))
+        else:
+            if len(tenants) > 1:
+                print(f"Syncing {len(tenants)} tenants: {', '.join(t.name for t in tenants)}")
+                size_connection_pools(min(TENANT_CONCURRENCY, len(tenants)))
+            if args.receive:
+                exit_code = run_receiver(tenants, max(1.0, args.interval or RECONCILE_INTERVAL_SECONDS))
+            elif args.daemon:
+                exit_code = run_daemon(tenants, max(1.0, args.interval or DAEMON_INTERVAL_SECONDS))
+            else:
+                exit_code = run_timed(lambda: run_tenants(tenants))
+    finally:
+        for tenant in tenants or []:
+            if tenant.archive is not None:
+                tenant.archive.close()
+        lock.release()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
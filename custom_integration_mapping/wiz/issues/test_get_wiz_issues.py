@@ -0,0 +1,141 @@
+"""
+Unit checks for get_wiz_issues.py state handling that needs neither Wiz nor OpsLevel.
+
+Run:
+    python -m pytest -q test_get_wiz_issues.py
+"""
+import get_wiz_issues
+
+
+def test_replay_delivers_batches_spooled_by_this_process(tmp_path, monkeypatch):
+    sent = []
+    monkeypatch.setattr(get_wiz_issues, "send_to_webhook", lambda nodes, uid, kind: sent.append(nodes) or True)
+    spool = get_wiz_issues.WebhookSpool(str(tmp_path))
+
+    spool.append([{"id": "a"}], "uid", "kind")
+    assert spool.replay(attempts=1)
+    assert spool.is_empty()
+
+    # Batches spooled after a replay go to a new segment and are picked up by the next one
+    spool.append([{"id": "b"}], "uid", "kind")
+    assert spool.replay(attempts=1)
+    assert spool.is_empty()
+    assert sent == [[{"id": "a"}], [{"id": "b"}]]
+
+
+def test_replay_keeps_batches_until_delivered(tmp_path, monkeypatch):
+    accept = False
+    sent = []
+
+    def send(nodes, uid, kind):
+        sent.append(nodes)
+        return accept
+
+    monkeypatch.setattr(get_wiz_issues, "send_to_webhook", send)
+    spool = get_wiz_issues.WebhookSpool(str(tmp_path))
+    spool.append([{"id": "a"}], "uid", "kind")
+    spool.append([{"id": "b"}], "uid", "kind")
+
+    assert not spool.replay(attempts=1)
+    assert not spool.is_empty()
+    assert sent == [[{"id": "a"}]]
+
+    accept = True
+    assert spool.replay(attempts=1)
+    assert spool.is_empty()
+    assert sent == [[{"id": "a"}], [{"id": "a"}], [{"id": "b"}]]
+
+
+class FullDiskSpool(get_wiz_issues.WebhookSpool):
+    def append(self, nodes, webhook_uid, external_kind):
+        raise OSError(28, "No space left on device")
+
+
+def test_batch_neither_delivered_nor_spooled_keeps_checkpoint_and_watermark(tmp_path, monkeypatch):
+    def fetch_shard(shard_key, query, variables, endpoint_url, send_queue, checkpoint, *args):
+        for page, issue_id in enumerate(("a", "b"), start=1):
+            checkpoint.observe([{"id": issue_id, "statusChangedAt": f"2025-01-0{page}T00:00:00.000Z"}])
+            send_queue.put((checkpoint, checkpoint.batch_created(), [{"id": issue_id}]))
+            checkpoint.page_completed(page, f"cursor-{page}", page)
+        return 2, 0, True
+
+    monkeypatch.setattr(get_wiz_issues, "fetch_shard", fetch_shard)
+    # The first batch is delivered; the second fails and cannot be spooled
+    monkeypatch.setattr(get_wiz_issues, "send_to_webhook", lambda nodes, uid, kind: nodes[0]["id"] == "a")
+    checkpoint_file = tmp_path / "checkpoint.json"
+    dedup = get_wiz_issues.DeliveryDedupCache(str(tmp_path / "dedup_cache.json"))
+
+    total, completed, max_status_changed_at = get_wiz_issues.fetch_all_issues(
+        "query", {"filterBy": {}}, "http://wiz.invalid/graphql", "uid", "kind", FullDiskSpool(str(tmp_path / "spool")),
+        checkpoint_file=str(checkpoint_file), dedup=dedup,
+    )
+
+    assert total == 2
+    assert not completed
+    assert max_status_changed_at is None
+    shard = get_wiz_issues.CheckpointStore(str(checkpoint_file)).get("all")
+    assert shard["after"] == "cursor-1"
+    assert not shard.get("completed")
+
+
+def test_reconcile_keeps_push_batches_pending(tmp_path):
+    dedup = get_wiz_issues.DeliveryDedupCache(str(tmp_path / "dedup_cache.json"), enabled=True)
+    polled = [{"id": "a", "status": "OPEN"}]
+    pushed = [{"id": "b", "status": "OPEN"}]
+    assert dedup.filter_changed(polled) == polled
+    assert dedup.filter_changed(pushed, source="push") == pushed
+
+    # A reconcile cycle starts while the push batch is still being sent
+    dedup.discard_pending()
+    dedup.mark_delivered(pushed)
+    dedup.mark_delivered(polled)
+
+    assert dedup.filter_changed(pushed, source="push") == []
+    assert dedup.filter_changed(polled) == polled
+
+
+def test_failed_batch_is_no_longer_pending(tmp_path):
+    dedup = get_wiz_issues.DeliveryDedupCache(str(tmp_path / "dedup_cache.json"), enabled=True)
+    pushed = [{"id": "b", "status": "OPEN"}]
+    assert dedup.filter_changed(pushed, source="push") == pushed
+    dedup.release(pushed)
+    assert dedup.filter_changed(pushed) == pushed
+
+
+def test_corrupt_token_cache_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_wiz_issues, "fetch_wiz_api_token", lambda client_id, secret, url: ("fresh-token", 3600))
+    cache_file = tmp_path / "token_cache.json"
+    for content in ('["not", "an", "object"]',
+                    '{"client_id": "id", "token_url": "https://wiz.invalid/oauth/token", '
+                    '"access_token": "stale-token", "expires_at": "soon"}'):
+        cache_file.write_text(content)
+        provider = get_wiz_issues.WizTokenProvider("id", "secret", "https://wiz.invalid/oauth/token", str(cache_file))
+        assert provider.get_token() == "fresh-token"
+
+
+def test_streamed_nodes_before_graphql_errors_are_not_fetched_again(tmp_path, monkeypatch):
+    calls = []
+
+    def query_streaming(query, variables, endpoint_url, on_node, stats, token_provider):
+        calls.append(variables["first"])
+        for issue_id in ("a", "b"):
+            on_node({"id": issue_id, "statusChangedAt": "2025-01-01T00:00:00.000Z"})
+        stats["graphql_errors"] = True
+        return {}
+
+    monkeypatch.setattr(get_wiz_issues, "STREAMING_DECODE", True)
+    monkeypatch.setattr(get_wiz_issues, "query_wiz_api_streaming", query_streaming)
+    send_queue = get_wiz_issues.queue.Queue()
+    store = get_wiz_issues.CheckpointStore(str(tmp_path / "checkpoint.json"))
+    checkpoint = get_wiz_issues.PaginationCheckpoint(store, "all", {})
+    dedup = get_wiz_issues.DeliveryDedupCache(str(tmp_path / "dedup_cache.json"), enabled=False)
+
+    _, _, completed = get_wiz_issues.fetch_shard("all", "query", {}, "http://wiz.invalid/graphql", send_queue,
+                                                 checkpoint, dedup)
+
+    assert not completed
+    assert len(calls) == 1
+    sent = []
+    while not send_queue.empty():
+        sent.extend(node["id"] for node in send_queue.get_nowait()[2])
+    assert sent == ["a", "b"]